@@ -0,0 +1,129 @@
+'''
+end to end move latency of Go with boards uploaded to storage versus
+attached to the message edit. discord and storage round trips are
+simulated, storage is the local backend
+
+    python -m benchmarks.delivery [--moves 40] [--rtt-ms 60] [--mbps 50] [--seed 0]
+'''
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+
+# storage settings are read on import
+os.environ.setdefault('STORAGE_BACKEND', 'local')
+os.environ.setdefault('STORAGE_DIRECTORY', tempfile.mkdtemp())
+os.environ.setdefault('CACHE_DIRECTORY', tempfile.mkdtemp())
+
+import s3
+from games.go.go import Go, STORAGE, ATTACHMENT
+from simulator import random_go_game
+from .frames import stub_sprites
+
+SIZES = (9, 19)
+
+class network():
+    '''
+    sleeps for one round trip plus the time to send `size` bytes
+    '''
+    def __init__(self, rtt_ms, mbps):
+        self.rtt = rtt_ms / 1000
+        self.bytes_per_second = mbps * 1e6 / 8
+
+    def delay(self, size=0):
+        return self.rtt + size / self.bytes_per_second
+
+class FakeUser():
+    def __init__(self, id):
+        self.id = id
+        self.name = self.display_name = self.mention = f'player{id}'
+
+class FakeClient():
+    user = FakeUser(0)
+
+class FakeMessage():
+    def __init__(self, link, id):
+        self.link = link
+        self.id = id
+
+    async def edit(self, attachments=None, **kwargs):
+        size = sum(len(attachment.fp.getvalue()) for attachment in attachments or ())
+        await asyncio.sleep(self.link.delay(size))
+
+    async def add_reaction(self, emoji):
+        pass
+
+    async def clear_reactions(self):
+        pass
+
+class FakeDatabase():
+    async def get_player(self, id):
+        return (id, None, None)
+
+def slow_storage(link):
+    # every put pays a round trip and the upload of its bytes
+    backend = s3.storage()
+    put = backend.put
+    def delayed_put(key, data, content_type):
+        time.sleep(link.delay(len(data)))
+        return put(key, data, content_type)
+    backend.put = delayed_put
+
+async def play_game(size, moves, delivery, link):
+    game = Go(
+        session_id=f'{delivery}-{size}',
+        client=FakeClient(),
+        db=FakeDatabase(),
+        channel=None,
+        message=FakeMessage(link, 1),
+        primary=FakeUser(1),
+        tertiary=FakeUser(2),
+        board_size=size)
+    game.delivery = delivery
+    await game.initialize_sub_message(FakeMessage(link, 2))
+    await game.render_message()
+
+    timings = []
+    for row, col in moves:
+        start = time.perf_counter()
+        await game.play_coordinate(f'{row + 1}{"ABCDEFGHIJKLMNOPQRSTUVWXYZ"[col]}')
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        'moves': len(timings),
+        'p50 ms': timings[len(timings) // 2] * 1000,
+        'p99 ms': timings[int(len(timings) * .99)] * 1000,
+        'mean ms': sum(timings) / len(timings) * 1000,
+    }
+
+async def run(moves, rtt_ms, mbps, seed):
+    stub_sprites(SIZES, emojis=(Go.BLACK_TILE, Go.WHITE_TILE))
+    link = network(rtt_ms, mbps)
+    slow_storage(link)
+    results = {}
+    for size in SIZES:
+        played = random_go_game(size, max_moves=moves, seed=seed)
+        for delivery in (STORAGE, ATTACHMENT):
+            results[f'{size}x{size} {delivery}'] = summarize(await play_game(size, played, delivery, link))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--moves', type=int, default=40)
+    parser.add_argument('--rtt-ms', type=float, default=60)
+    parser.add_argument('--mbps', type=float, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.moves, args.rtt_ms, args.mbps, args.seed))
+    columns = ['moves', 'p50 ms', 'p99 ms', 'mean ms']
+    print(f"{'':<22}" + ''.join(f"{column:>12}" for column in columns))
+    for name, result in results.items():
+        print(f"{name:<22}" + ''.join(f"{result[column]:>12,.2f}" if isinstance(result[column], float) else f"{result[column]:>12,}" for column in columns))
+
+if __name__ == '__main__':
+    main()
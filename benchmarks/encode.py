@@ -0,0 +1,47 @@
+'''
+encode time and size of a board frame in every output format
+
+    python -m benchmarks.encode [--repeat 20] [--seed 0]
+'''
+import time
+import argparse
+
+from games.go.render import GameStateRenderer, IMAGE_FORMATS, encode_frame
+from .frames import DENSITIES, synthetic_position, stub_sprites
+
+SIZES = (9, 13, 19)
+
+def time_encode(frame, format, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        data = encode_frame(frame, format=format)
+        timings.append(time.perf_counter_ns() - start)
+    timings.sort()
+    return len(data), timings[len(timings) // 2] / 1e6
+
+def run(repeat, seed):
+    stub_sprites(SIZES)
+    results = {}
+    for size in SIZES:
+        # the middle density stands in for a game in progress
+        state = synthetic_position(size, DENSITIES[1], seed)
+        with GameStateRenderer(state) as frame:
+            for format in IMAGE_FORMATS:
+                results[(size, format)] = time_encode(frame, format, repeat)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    results = run(args.repeat, args.seed)
+    print(f"{'':<18}{'bytes':>12}{'p50 ms':>12}{'vs jpeg':>12}")
+    for (size, format), (size_bytes, encode_ms) in results.items():
+        ratio = size_bytes / results[(size, 'jpeg')][0]
+        print(f"{f'{size}x{size} {format}':<18}{size_bytes:>12,}{encode_ms:>12,.2f}{ratio:>12.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+'''
+synthetic positions and stand-in emoji sprites for the rendering
+benchmarks, so frames can be drawn without the network or a database
+'''
+import random
+import tempfile
+
+from PIL import Image, ImageDraw
+
+from games.go.board import BLACK, WHITE, EMPTY
+from games.go.render import GameStateRenderer, EMOJI_SIZE
+from games.go.replay import replayState
+from utils import image
+
+EMOJIS = ('⚫', '⚪')
+SPRITE_COLORS = {'⚫': (20, 20, 20, 255), '⚪': (240, 240, 240, 255)}
+DENSITIES = (.1, .4, .7)
+
+def synthetic_position(size, density, seed=0):
+    '''
+    a state GameStateRenderer can draw, with random legal moves played
+    until about `density` of the points hold stones
+    '''
+    rng = random.Random(seed)
+    state = replayState(size, players={BLACK: 1, WHITE: 2}, primary=1, emojis=EMOJIS)
+    target = int(size * size * density)
+    for _ in range(size * size * 4):
+        board = state.goban
+        stones = sum(1 for value in board.cells if value != EMPTY)
+        if stones >= target:
+            break
+        empty = [point for point, value in enumerate(board.cells) if value == EMPTY]
+        point = rng.choice(empty)
+        if board.is_legal(point, state.current_color, state.positions):
+            state.apply((state.current_color, *board.coords(point)))
+    return state
+
+def sprite(emoji, scale):
+    side = int(EMOJI_SIZE * scale)
+    buffer = Image.new('RGBA', (side, side), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(buffer)
+    draw.ellipse((1, 1, side - 2, side - 2), fill=SPRITE_COLORS.get(emoji, (200, 40, 40, 255)))
+    del draw
+    return buffer
+
+def stub_sprites(sizes, emojis=EMOJIS):
+    '''
+    swaps in a sprite cache whose memory already holds every emoji at the
+    scale each board size renders at, so nothing is rasterized or fetched
+    '''
+    cache = image.EmojiSpriteCache(directory=tempfile.mkdtemp(), capacity=len(sizes) * len(emojis))
+    for size in sizes:
+        scale = round(GameStateRenderer(synthetic_position(size, 0)).tile_scale, 3)
+        for emoji in emojis:
+            cache.sprites[(emoji, scale)] = sprite(emoji, scale)
+    image._emoji_cache = cache
+    return cache
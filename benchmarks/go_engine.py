@@ -0,0 +1,65 @@
+'''
+per-move cost of the go rules engine across board sizes
+
+    python -m benchmarks.go_engine [--games 20] [--seed 0]
+'''
+import time
+import random
+import argparse
+
+from games.go.board import EMPTY, opponent
+from games.go.logic import ruleset
+from simulator import HeadlessGo
+
+SIZES = (9, 13, 19)
+
+def play_random_game(size, rng):
+    '''
+    plays random placements until the board fills up, returns the
+    nanoseconds spent in every accepted attempt_placement call
+    '''
+    state = HeadlessGo(size)
+    timings = []
+    for _ in range(size * size * 2):
+        empty = [point for point, color in enumerate(state.goban.cells) if color == EMPTY]
+        if not empty:
+            break
+        state.row_selection, state.col_selection = state.goban.coords(rng.choice(empty))
+        start = time.perf_counter_ns()
+        is_valid_placement = ruleset.attempt_placement(state)
+        elapsed = time.perf_counter_ns() - start
+        if is_valid_placement:
+            timings.append(elapsed)
+            state.current_color = opponent(state.current_color)
+    return timings
+
+def run(games, seed):
+    rng = random.Random(seed)
+    results = {}
+    for size in SIZES:
+        timings = []
+        for _ in range(games):
+            timings.extend(play_random_game(size, rng))
+        timings.sort()
+        results[size] = {
+            'moves': len(timings),
+            'mean': sum(timings) / len(timings) / 1000,
+            'p50': timings[len(timings) // 2] / 1000,
+            'p99': timings[int(len(timings) * .99)] / 1000,
+        }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--games', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    results = run(args.games, args.seed)
+    baseline = results[SIZES[0]]['mean']
+    print(f"{'size':>7} {'moves':>8} {'mean us':>9} {'p50 us':>9} {'p99 us':>9} {'vs 9x9':>7}")
+    for size, result in results.items():
+        print(f"{f'{size}x{size}':>7} {result['moves']:>8} {result['mean']:>9.2f} {result['p50']:>9.2f} {result['p99']:>9.2f} {result['mean'] / baseline:>6.2f}x")
+
+if __name__ == '__main__':
+    main()
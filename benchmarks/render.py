@@ -0,0 +1,144 @@
+'''
+rendering benchmark suite: draws synthetic positions through
+GameStateRenderer and GobanRenderer with stand-in sprites and storage and
+reports per-stage timings, frames per second and peak memory
+
+    python -m benchmarks.render [--repeat 20] [--seed 0]
+'''
+import time
+import resource
+import argparse
+import tracemalloc
+
+from PIL import Image
+
+import s3
+from games.go import render
+from games.go.render import (
+    GameStateRenderer, GobanRenderer, BoardFrame, GridRenderer, BackgroundRenderer, LegendRenderer,
+    IMAGE_FORMAT, encode_frame, static_layer)
+from .frames import DENSITIES, synthetic_position, stub_sprites
+
+SIZES = (9, 13, 19)
+STAGES = ('background', 'grid', 'legend', 'stones', 'move', 'encode', 'save')
+
+def median_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        fn()
+        timings.append(time.perf_counter_ns() - start)
+    timings.sort()
+    return timings[len(timings) // 2] / 1e6
+
+def stub_storage():
+    # uploads land nowhere, the benchmark measures drawing and encoding only
+    s3.upload_bytes = lambda data, key, content_type=None: key
+
+def background_stage(renderer):
+    def draw():
+        # the resized wood is cached per size, drop it to time the real work
+        render.load_background.cache_clear()
+        with Image.new(mode='RGBA', size=(renderer.height, renderer.width)) as buffer:
+            BackgroundRenderer(buffer, renderer.width, renderer.height)
+    return draw
+
+def grid_stage(renderer):
+    def draw():
+        with GridRenderer(renderer.x_grid, renderer.y_grid, renderer.width, renderer.height, renderer.line_width):
+            pass
+    return draw
+
+def legend_stage(renderer):
+    grid = GridRenderer(renderer.x_grid, renderer.y_grid, renderer.width, renderer.height, renderer.line_width)
+    size = (renderer.height + grid.step_size_y * 2, renderer.width + grid.step_size_x * 2)
+    def draw():
+        with Image.new(mode='RGBA', size=size) as buffer:
+            LegendRenderer(grid, buffer, renderer.legend_margin_x, renderer.legend_margin_y,
+                renderer.legend_padding, renderer.font_size, renderer.typeface)
+    return draw
+
+def stones_stage(state):
+    # full redraw over the cached static layer
+    def draw():
+        with GameStateRenderer(state):
+            pass
+    return draw
+
+def last_stone(state):
+    return max(point for point, value in enumerate(state.goban.cells) if value)
+
+def move_stage(state):
+    # one stone changed since the last frame, the common case in a game
+    frame = BoardFrame()
+    with GameStateRenderer(state, frame=frame):
+        pass
+    dirty = frozenset((last_stone(state),))
+    def draw():
+        with GameStateRenderer(state, frame=frame, dirty=dirty):
+            pass
+    return draw
+
+def encode_stage(state):
+    with GameStateRenderer(state) as buffer:
+        frame = buffer.copy()
+    return lambda: encode_frame(frame, format=IMAGE_FORMAT)
+
+def save_stage(state):
+    renderer = GobanRenderer(state, state.get_player_emojis(), frame=BoardFrame(), dirty=(last_stone(state),))
+    return renderer.save
+
+def peak_memory(state):
+    # python heap only, PIL allocates image buffers outside tracemalloc
+    tracemalloc.start()
+    GobanRenderer(state, state.get_player_emojis()).save()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+def run(repeat, seed):
+    stub_sprites(SIZES)
+    stub_storage()
+    results = {}
+    for size in SIZES:
+        for density in DENSITIES:
+            state = synthetic_position(size, density, seed)
+            state.assets_directory = 'benchmark'
+            renderer = GameStateRenderer(state)
+            # warm the static layer so the stone stages exclude it
+            static_layer.cache_clear()
+            with GameStateRenderer(state):
+                pass
+
+            stages = {
+                'background': background_stage(renderer),
+                'grid': grid_stage(renderer),
+                'legend': legend_stage(renderer),
+                'stones': stones_stage(state),
+                'move': move_stage(state),
+                'encode': encode_stage(state),
+                'save': save_stage(state),
+            }
+            result = {stage: median_ms(fn, repeat) for stage, fn in stages.items()}
+            result['fps'] = 1000 / result['save']
+            result['py peak KB'] = peak_memory(state) / 1024
+            results[f'{size}x{size} {density:.0%}'] = result
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    results = run(args.repeat, args.seed)
+    columns = [f'{stage} ms' for stage in STAGES] + ['fps', 'py peak KB']
+    print(f"image format {IMAGE_FORMAT}, stage times are medians, save is an incremental GobanRenderer.save")
+    print(f"{'':<12}" + ''.join(f"{column:>14}" for column in columns))
+    for name, result in results.items():
+        values = [result[stage] for stage in STAGES] + [result['fps'], result['py peak KB']]
+        print(f"{name:<12}" + ''.join(f"{value:>14,.2f}" for value in values))
+    print(f"\nmax rss {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:,.0f} MB")
+
+if __name__ == '__main__':
+    main()
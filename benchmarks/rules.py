@@ -0,0 +1,146 @@
+'''
+rules engine benchmark suite: replays the mock scenarios and generated
+random games headlessly and reports throughput, transient allocation per
+move and latency percentiles for the hot paths
+
+    python -m benchmarks.rules [--games 50] [--seed 0]
+'''
+import time
+import argparse
+import tracemalloc
+
+from games.go.logic import ruleset
+from games.go.board import BLACK, WHITE, opponent
+from games.go.scenarios import SCENARIOS
+from simulator import HeadlessGo, HeadlessConnect4, replay, random_go_game, random_connect4_game
+
+GO_SIZES = (9, 13, 19)
+# (moves accepted, black stones, white stones left) per scenario, checked
+# before every run so a rules engine regression fails it
+SCENARIO_OUTCOMES = {
+    'capture': ([True] * 10, 3, 5),
+    'sacrifice': ([True] * 6 + [False] + [True] * 2, 4, 4),
+    'occupied': ([True, False, True, True, False], 2, 1),
+    'nested_capture': ([True] * 17, 9, 4),
+}
+
+def go_placements(games, size):
+    '''
+    yields (game, row, col) for every move of every game, with the game
+    advanced up to that move
+    '''
+    for moves in games:
+        game = HeadlessGo(size)
+        for row, col in moves:
+            yield game, row, col
+
+def time_attempt_placement(games, size):
+    timings = []
+    for game, row, col in go_placements(games, size):
+        game.row_selection, game.col_selection = row, col
+        start = time.perf_counter_ns()
+        is_valid_placement = ruleset.attempt_placement(game)
+        timings.append(time.perf_counter_ns() - start)
+        if is_valid_placement:
+            game.current_color = opponent(game.current_color)
+    return timings
+
+def traced_peak(fn, *args):
+    # peak bytes allocated during fn(*args). tracing restarts for every call,
+    # tracemalloc.reset_peak needs python 3.9
+    tracemalloc.start()
+    try:
+        result = fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+def allocate_attempt_placement(games, size):
+    # on a separate pass since tracing slows every allocation down
+    allocations = []
+    for game, row, col in go_placements(games, size):
+        game.row_selection, game.col_selection = row, col
+        is_valid_placement, peak = traced_peak(ruleset.attempt_placement, game)
+        if is_valid_placement:
+            game.current_color = opponent(game.current_color)
+        allocations.append(peak)
+    return allocations
+
+def connect4_positions(games):
+    for moves in games:
+        game = HeadlessConnect4()
+        for col in moves:
+            game.board.play(col, game.current_slot)
+            yield game
+            game.current_slot = 1 - game.current_slot
+
+def time_detect_win(games):
+    timings = []
+    for game in connect4_positions(games):
+        start = time.perf_counter_ns()
+        game.detect_current_player_win()
+        timings.append(time.perf_counter_ns() - start)
+    return timings
+
+def allocate_detect_win(games):
+    allocations = []
+    for game in connect4_positions(games):
+        _, peak = traced_peak(game.detect_current_player_win)
+        allocations.append(peak)
+    return allocations
+
+def summarize(timings, allocations):
+    timings = sorted(timings)
+    return {
+        'moves': len(timings),
+        'moves/s': len(timings) / (sum(timings) / 1e9),
+        'alloc B/move': sum(allocations) / len(allocations),
+        'p50 us': timings[len(timings) // 2] / 1000,
+        'p99 us': timings[int(len(timings) * .99)] / 1000,
+    }
+
+def check_scenarios():
+    # the scripted scenarios double as a regression test of the rules engine
+    results = {}
+    for name, moves in SCENARIOS.items():
+        game = HeadlessGo()
+        accepted = replay(game, moves)
+        outcome = (accepted, game.goban.cells.count(BLACK), game.goban.cells.count(WHITE))
+        if outcome != SCENARIO_OUTCOMES[name]:
+            raise AssertionError(f"scenario {name} ended with {outcome}, expected {SCENARIO_OUTCOMES[name]}")
+        results[name] = accepted
+    return results
+
+def run(games, seed):
+    results = {}
+    for size in GO_SIZES:
+        played = [random_go_game(size, seed=seed + idx) for idx in range(games)]
+        results[f'attempt_placement {size}x{size}'] = summarize(
+            time_attempt_placement(played, size),
+            allocate_attempt_placement(played, size))
+
+    played = [random_connect4_game(seed=seed + idx) for idx in range(games)]
+    results['detect_current_player_win'] = summarize(
+        time_detect_win(played),
+        allocate_detect_win(played))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--games', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for name, accepted in check_scenarios().items():
+        print(f"scenario {name}: {sum(accepted)}/{len(accepted)} moves accepted")
+    print()
+
+    results = run(args.games, args.seed)
+    columns = ['moves', 'moves/s', 'alloc B/move', 'p50 us', 'p99 us']
+    print(f"{'':<28}" + ''.join(f"{column:>14}" for column in columns))
+    for name, result in results.items():
+        print(f"{name:<28}" + ''.join(f"{result[column]:>14,.2f}" if isinstance(result[column], float) else f"{result[column]:>14,}" for column in columns))
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,15 @@
 from dotenv import load_dotenv
-load_dotenv()
+# pool workers import this module again as __mp_main__, they inherit the
+# environment and must not set anything up
+if __name__ == '__main__':
+    load_dotenv()
 
 import os
 import sys
 import random
 import asyncio
 
-from database import PlayersTable
+from database import PlayersTable, GameJournal, MatchesTable
 from router import SessionManager
 from games import GAMES, MOCK, Connect4, Go
 from utils import logger
@@ -17,15 +20,18 @@ from emoji import UNICODE_EMOJI
 DISCORD_API_KEY = os.environ.get("DISCORD_API_KEY")
 ADMIN_ID = os.environ.get("ADMIN_ID")
 
-client = discord.Client()
-players = PlayersTable()
-sessions = SessionManager(client, players)
+# set up by main(), only in the process that logs in
+client = None
+players = None
+journal = None
+matches = None
+sessions = None
 
-@client.event
 async def on_ready():
     logger.info(f'We have logged in as {client.user}')
+    restored = await sessions.restore_sessions(GAMES)
+    restored and logger.info(f'Restored {restored} games in progress')
 
-@client.event
 async def on_message(message):
     if message.author == client.user:
         return
@@ -35,20 +41,89 @@ async def on_message(message):
 
     if message.content.startswith('>help'):
         await message.channel.send('''```>go @Person     | challenge Person to 9x9 Go
+>connect4 @Bot  | play the bot at Connect4, add easy, medium or hard
+>go @Person 19  | challenge Person to 13x13 or 19x19 Go
+>move 4D        | place a stone by typing its row and column
+>pass           | pass your turn, two passes in a row start scoring
+>dead 4D        | while scoring, mark or unmark a chain as dead
+>accept         | agree to the dead stones, the game ends once both agree
+>resume         | disagree with the dead stones and play on
 >resign @Person | end game with Person
->emoji :emoji:  | change emoji to selection```''')
+>emoji :emoji:  | change emoji to selection
+>stats @Person  | wins, losses and streaks, yours without a mention
+>leaderboard go | most wins at go or connect4```''')
 
     if message.content.startswith('>connect4'):
         if message.mentions and message.mentions[0]:
-            await sessions.add_session(channel=message.channel, primary=message.author, tertiary=message.mentions[0], application=Connect4)
+            difficulty = [arg for arg in message.content.split(' ')[1:] if arg in Connect4.DIFFICULTIES]
+            options = {'difficulty': difficulty[0]} if difficulty else {}
+            await sessions.add_session(channel=message.channel, primary=message.author, tertiary=message.mentions[0], application=Connect4, options=options)
         else:
             await message.channel.send(f"you need to mention someone to challenge them to a match")
 
     if message.content.startswith('>go'):
         if message.mentions and message.mentions[0]:
-            await sessions.add_session(channel=message.channel, primary=message.author, tertiary=message.mentions[0], application=Go)
+            size = [arg for arg in message.content.split(' ')[1:] if arg.isdigit()]
+            board_size = int(size[0]) if size else Go.BOARD_X
+            if board_size not in Go.BOARD_SIZES:
+                await message.channel.send(f"board size must be one of {', '.join(str(size) for size in Go.BOARD_SIZES)}")
+                return
+            await sessions.add_session(channel=message.channel, primary=message.author, tertiary=message.mentions[0], application=Go, options={'board_size': board_size})
         else:
             await message.channel.send(f"you need to mention someone to challenge them to a match")
+
+    if message.content.startswith('>move'):
+        session = sessions.get_session_by_channel(message.author.id, message.channel.id)
+        if not session or not hasattr(session, 'play_coordinate'):
+            await message.channel.send(f"no active go session found in this channel")
+            return
+        if session.scoring_phase:
+            await message.channel.send(f"the game is being scored, >accept the dead stones or >resume play")
+            return
+        if session.lock or session.is_completed() or not session.is_player_current(message.author):
+            await message.channel.send(f"it's not your move")
+            return
+        await session.play_coordinate(message.content.split('>move', 1)[1])
+
+    if message.content.startswith('>pass'):
+        session = sessions.get_session_by_channel(message.author.id, message.channel.id)
+        if not session or not hasattr(session, 'pass_move'):
+            await message.channel.send(f"no active go session found in this channel")
+            return
+        if session.scoring_phase:
+            await message.channel.send(f"the game is being scored, >accept the dead stones or >resume play")
+            return
+        if session.lock or session.is_completed() or not session.is_player_current(message.author):
+            await message.channel.send(f"it's not your move")
+            return
+        await session.pass_move()
+
+    if message.content.startswith('>dead'):
+        session = sessions.get_session_by_channel(message.author.id, message.channel.id)
+        if not session or not hasattr(session, 'toggle_dead'):
+            await message.channel.send(f"no active go session found in this channel")
+            return
+        if not session.scoring_phase:
+            await message.channel.send(f"dead stones are marked once both players pass, games against the bot count the board as it stands")
+            return
+        if not await session.toggle_dead(message.content.split('>dead', 1)[1], message.author):
+            await message.channel.send(f"there is no stone at that point")
+
+    if message.content.startswith('>accept'):
+        session = sessions.get_session_by_channel(message.author.id, message.channel.id)
+        if not session or not hasattr(session, 'accept_score'):
+            await message.channel.send(f"no active go session found in this channel")
+            return
+        if not await session.accept_score(message.author):
+            await message.channel.send(f"the game is not being scored")
+
+    if message.content.startswith('>resume'):
+        session = sessions.get_session_by_channel(message.author.id, message.channel.id)
+        if not session or not hasattr(session, 'resume_play'):
+            await message.channel.send(f"no active go session found in this channel")
+            return
+        if not await session.resume_play():
+            await message.channel.send(f"the game is not being scored")
     
     if message.content.startswith('>resign'):
         if message.mentions and message.mentions[0]:
@@ -81,6 +156,36 @@ async def on_message(message):
 
         await sessions.remove_session(channel=message.channel, primary=message.author, tertiary=client.user)
 
+    if message.content.startswith('>stats'):
+        player = message.mentions[0] if message.mentions else message.author
+        stats = await matches.get_stats(player.id)
+        if not stats:
+            await message.channel.send(f"{player.display_name} has not finished a game yet")
+            return
+        lines = [
+            f"{application:<9}| {wins}W {losses}L {draws}D | streak {render_streak(streak)} | best {best_streak}W"
+            for application, wins, losses, draws, streak, best_streak in stats
+        ]
+        await message.channel.send(f"```{player.display_name}\n" + '\n'.join(lines) + "```")
+
+    if message.content.startswith('>leaderboard'):
+        args = message.content.split(' ')[1:]
+        application = args[0] if args else 'go'
+        if application not in GAMES:
+            await message.channel.send(f"leaderboards are kept for {', '.join(GAMES.keys())}")
+            return
+        leaders = await matches.get_leaderboard(application)
+        if not leaders:
+            await message.channel.send(f"no {application} games have finished yet")
+            return
+        lines = [
+            f"{rank}. <@{player_id}> {wins}W {losses}L {draws}D, streak {render_streak(streak)}"
+            for rank, (player_id, wins, losses, draws, streak) in enumerate(leaders, 1)
+        ]
+        await message.channel.send(
+            f"**{application} leaderboard**\n" + '\n'.join(lines),
+            allowed_mentions=discord.AllowedMentions.none())
+
     if message.content.startswith('>emoji'):
         emoji = message.content.split('>emoji ')
         if len(emoji) != 2 or emoji[1] not in UNICODE_EMOJI:
@@ -89,23 +194,25 @@ async def on_message(message):
         await message.channel.send(f"set emoji")
         emoji = emoji[1]
 
-        players.insert_player(message.author.id)
-        players.update_player_emoji(message.author.id, emoji)
+        await players.insert_player(message.author.id)
+        await players.update_player_emoji(message.author.id, emoji)
         games = sessions.get_session_by_player(message.author.id)
         if games:
             for board in games:
                 await board.render_message()
 
     if message.content.startswith('>rm emoji'):
-        players.insert_player(message.author.id)
-        players.update_player_emoji(message.author.id, None)
+        await players.insert_player(message.author.id)
+        await players.update_player_emoji(message.author.id, None)
         await message.channel.send(f"unset emoji")
         games = sessions.get_session_by_player(message.author.id)
         if games:
             for board in games:
                 await board.render_message()
 
-@client.event
+def render_streak(streak):
+    return f"{streak}W" if streak > 0 else f"{-streak}L" if streak < 0 else "-"
+
 async def on_raw_reaction_add(payload):
     if payload.member == client.user:
         return
@@ -119,13 +226,30 @@ async def on_raw_reaction_add(payload):
     session = sessions.get_session_by_message(payload.message_id)
 
     if session:
-        if not session.lock and session.is_player_current(payload.member):
-            await session.play_move(payload)
-        elif session.is_completed():
+        # a finished game takes no more moves, any reaction closes it
+        if session.is_completed():
             await sessions.remove_session(channel=message.channel, primary=session.primary, tertiary=session.tertiary)
+        elif not session.lock and session.is_player_current(payload.member):
+            await session.play_move(payload)
 
         await session.message.remove_reaction(payload.emoji, payload.member)
         if session.sub_message:
             await session.sub_message.remove_reaction(payload.emoji, payload.member)
 
-client.run(DISCORD_API_KEY)
\ No newline at end of file
+def main():
+    global client, players, journal, matches, sessions
+    # reading commands needs the privileged message content intent, enable it
+    # for the bot in the discord developer portal
+    intents = discord.Intents.default()
+    intents.message_content = True
+    client = discord.Client(intents=intents)
+    for handler in (on_ready, on_message, on_raw_reaction_add):
+        client.event(handler)
+    players = PlayersTable()
+    journal = GameJournal()
+    matches = MatchesTable()
+    sessions = SessionManager(client, players, journal, matches)
+    client.run(DISCORD_API_KEY)
+
+if __name__ == '__main__':
+    main()
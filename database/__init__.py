@@ -1 +1,4 @@
-from .players import PlayersTable
\ No newline at end of file
+from .players import PlayersTable
+from .journal import GameJournal
+from .matches import MatchesTable
+from .connection import Connection, connection
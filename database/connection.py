@@ -0,0 +1,66 @@
+import os
+import sqlite3
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+DATABASE_PATH = os.getenv('DATABASE_PATH', './database/db.sqlite3')
+
+class Connection():
+    '''
+    one sqlite connection owned by one thread. every query runs on that
+    thread so the event loop never waits on disk, and each call is a
+    single transaction
+    '''
+    def __init__(self, path=DATABASE_PATH):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='database')
+        self.conn = self.executor.submit(self.open).result()
+
+    def open(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        # readers never block the writer, and commits skip the fsync of the
+        # main database file, which is safe in wal mode
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def transaction(self, fn, *args):
+        with self.conn:
+            return fn(self.conn.cursor(), *args)
+
+    def run_sync(self, fn, *args):
+        '''
+        fn(cursor, *args) in a transaction, blocking. for startup only
+        '''
+        return self.executor.submit(self.transaction, fn, *args).result()
+
+    async def run(self, fn, *args):
+        '''
+        fn(cursor, *args) in a transaction on the database thread
+        '''
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.transaction, fn, *args)
+
+    async def execute(self, sql, parameters=()):
+        return await self.run(lambda c: c.execute(sql, parameters).rowcount)
+
+    async def executemany(self, sql, rows):
+        rows = list(rows)
+        return await self.run(lambda c: c.executemany(sql, rows).rowcount)
+
+    async def fetchone(self, sql, parameters=()):
+        return await self.run(lambda c: c.execute(sql, parameters).fetchone())
+
+    async def fetchall(self, sql, parameters=()):
+        return await self.run(lambda c: c.execute(sql, parameters).fetchall())
+
+_connection = None
+
+def connection():
+    '''
+    the connection every table shares unless given its own
+    '''
+    global _connection
+    if _connection is None:
+        _connection = Connection()
+    return _connection
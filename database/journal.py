@@ -0,0 +1,68 @@
+from collections import defaultdict
+
+from .connection import connection as shared_connection
+
+class GameJournal():
+    '''
+    every live game and each move accepted in it, so sessions survive a
+    restart. finished games are dropped, the journal only holds live ones.
+    games may journal other entries in the same sequence, Go writes dead
+    stone marks as moves without a color and resumed play as an entry
+    without a color or point. acceptance of the marks is not kept, a game
+    restored while scoring is accepted again
+    '''
+    def __init__(self, connection=None):
+        self.connection = connection or shared_connection()
+        self.connection.run_sync(self.create)
+
+    @staticmethod
+    def create(c):
+        c.execute('''CREATE TABLE IF NOT EXISTS games (
+                        id TEXT PRIMARY KEY,
+                        application TEXT,
+                        channel_id INTEGER,
+                        message_id INTEGER,
+                        sub_message_id INTEGER,
+                        primary_id INTEGER,
+                        tertiary_id INTEGER,
+                        first_id INTEGER,
+                        options TEXT
+                    )''')
+        # clustered on (game_id, seq) so a game's moves are read in one range scan
+        c.execute('''CREATE TABLE IF NOT EXISTS moves (
+                        game_id TEXT,
+                        seq INTEGER,
+                        color INTEGER,
+                        row INTEGER,
+                        col INTEGER,
+                        PRIMARY KEY (game_id, seq)
+                    ) WITHOUT ROWID''')
+
+    async def start_game(self, game_id, application, channel_id, message_id, sub_message_id,
+        primary_id, tertiary_id, first_id, options):
+        data = (str(game_id), application, channel_id, message_id, sub_message_id,
+            primary_id, tertiary_id, first_id, options)
+        await self.connection.execute('INSERT OR REPLACE INTO games VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)', data)
+
+    async def record_move(self, game_id, seq, color, row, col):
+        data = (str(game_id), seq, color, row, col)
+        await self.connection.execute('INSERT OR REPLACE INTO moves VALUES(?, ?, ?, ?, ?)', data)
+
+    async def end_game(self, game_id):
+        def delete(c):
+            c.execute('DELETE FROM moves WHERE game_id=?', (str(game_id),))
+            c.execute('DELETE FROM games WHERE id=?', (str(game_id),))
+        await self.connection.run(delete)
+
+    async def live_games(self):
+        '''
+        (game row, [(color, row, col), ...]) for every live game, read in
+        two queries however many games there are
+        '''
+        def read(c):
+            games = c.execute('SELECT * FROM games').fetchall()
+            moves = defaultdict(list)
+            for game_id, color, row, col in c.execute('SELECT game_id, color, row, col FROM moves ORDER BY game_id, seq'):
+                moves[game_id].append((color, row, col))
+            return [(game, moves[game[0]]) for game in games]
+        return await self.connection.run(read)
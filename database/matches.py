@@ -0,0 +1,91 @@
+import time
+
+from .connection import connection as shared_connection
+
+WIN = 'win'
+RESIGN = 'resign'
+DRAW = 'draw'
+
+LEADERBOARD_SIZE = 10
+
+class MatchesTable():
+    '''
+    every finished game, plus running totals per player and game that are
+    updated as each result comes in, so stats never scan the history
+    '''
+    def __init__(self, connection=None):
+        self.connection = connection or shared_connection()
+        self.connection.run_sync(self.create)
+
+    @staticmethod
+    def create(c):
+        c.execute('''CREATE TABLE IF NOT EXISTS matches (
+                        id INTEGER PRIMARY KEY,
+                        game_id TEXT,
+                        application TEXT,
+                        primary_id INTEGER,
+                        tertiary_id INTEGER,
+                        winner_id INTEGER,
+                        loser_id INTEGER,
+                        result TEXT,
+                        moves INTEGER,
+                        finished_at INTEGER
+                    )''')
+        c.execute('CREATE INDEX IF NOT EXISTS matches_primary ON matches(primary_id, finished_at)')
+        c.execute('CREATE INDEX IF NOT EXISTS matches_tertiary ON matches(tertiary_id, finished_at)')
+        # streak counts wins in a row when positive and losses when negative
+        c.execute('''CREATE TABLE IF NOT EXISTS player_stats (
+                        player_id INTEGER,
+                        application TEXT,
+                        wins INTEGER DEFAULT 0,
+                        losses INTEGER DEFAULT 0,
+                        draws INTEGER DEFAULT 0,
+                        streak INTEGER DEFAULT 0,
+                        best_streak INTEGER DEFAULT 0,
+                        PRIMARY KEY (player_id, application)
+                    ) WITHOUT ROWID''')
+        c.execute('CREATE INDEX IF NOT EXISTS player_stats_leaderboard ON player_stats(application, wins DESC, losses)')
+
+    async def record_match(self, game_id, application, primary_id, tertiary_id, winner_id, loser_id, result, moves):
+        '''
+        stores one result and folds it into both players' totals in the
+        same transaction. draws have no winner or loser
+        '''
+        match = (str(game_id), application, primary_id, tertiary_id, winner_id, loser_id, result, moves, int(time.time()))
+        if result == DRAW:
+            outcomes = [(primary_id, 0, 0, 1), (tertiary_id, 0, 0, 1)]
+        else:
+            outcomes = [(winner_id, 1, 0, 0), (loser_id, 0, 1, 0)]
+
+        def record(c):
+            c.execute('''INSERT INTO matches(game_id, application, primary_id, tertiary_id, winner_id, loser_id, result, moves, finished_at)
+                        VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)''', match)
+            c.executemany('''INSERT INTO player_stats(player_id, application, wins, losses, draws, streak, best_streak)
+                        VALUES(?1, ?2, ?3, ?4, ?5, ?3 - ?4, ?3)
+                        ON CONFLICT(player_id, application) DO UPDATE SET
+                            wins = wins + excluded.wins,
+                            losses = losses + excluded.losses,
+                            draws = draws + excluded.draws,
+                            streak = CASE
+                                WHEN excluded.wins THEN MAX(streak, 0) + 1
+                                WHEN excluded.losses THEN MIN(streak, 0) - 1
+                                ELSE 0 END,
+                            best_streak = MAX(best_streak, CASE WHEN excluded.wins THEN MAX(streak, 0) + 1 ELSE 0 END)''',
+                [(player_id, application, wins, losses, draws) for player_id, wins, losses, draws in outcomes])
+        await self.connection.run(record)
+
+    async def get_stats(self, player_id):
+        '''
+        (application, wins, losses, draws, streak, best streak) per game played
+        '''
+        return await self.connection.fetchall(
+            'SELECT application, wins, losses, draws, streak, best_streak FROM player_stats WHERE player_id=? ORDER BY application',
+            (player_id,))
+
+    async def get_leaderboard(self, application, limit=LEADERBOARD_SIZE):
+        '''
+        (player id, wins, losses, draws, streak) of the players with the most wins
+        '''
+        return await self.connection.fetchall(
+            'SELECT player_id, wins, losses, draws, streak FROM player_stats WHERE application=? ORDER BY wins DESC, losses LIMIT ?',
+            (application, limit))
@@ -1,48 +1,78 @@
-import sqlite3
+from collections import OrderedDict
+
+from .connection import connection as shared_connection
+
+# player rows kept in memory, renders read them for every move
+PROFILE_CACHE_SIZE = 4096
 
 class PlayersTable():
-    def __init__(self):
-        self.conn = sqlite3.connect('./database/db.sqlite3')
-        c = self.conn.cursor()
+    def __init__(self, connection=None, cache_size=PROFILE_CACHE_SIZE):
+        self.connection = connection or shared_connection()
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.connection.run_sync(self.create)
+
+    @staticmethod
+    def create(c):
         c.execute('''CREATE TABLE IF NOT EXISTS players (
                         id TEXT,
                         emoji TEXT,
                         color BLOB
                     )''')
+        indexed = c.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name='players_id'").fetchone()
+        if not indexed:
+            # without a unique id every insert added another row. updates hit
+            # all of them, so the oldest row of each id holds the profile
+            c.execute('DELETE FROM players WHERE rowid NOT IN (SELECT MIN(rowid) FROM players GROUP BY id)')
+            c.execute('CREATE UNIQUE INDEX players_id ON players(id)')
 
-        self.conn.commit()
-
-    def insert_bulk(self, players):
+    async def insert_bulk(self, players):
+        players = [str(player_id) for player_id in players]
+        await self.connection.executemany(
+            'INSERT OR IGNORE INTO players VALUES(?, NULL, NULL)',
+            ((player_id,) for player_id in players))
         for player_id in players:
-            self.insert_player(player_id)
-    
-    def insert_player(self, player_id):
-        c = self.conn.cursor()
-        data = (str(player_id), None, None)
-        c.execute('INSERT OR IGNORE INTO players VALUES(?, ?, ?)', data)
-        self.conn.commit()
-
-    def remove_player(self, player_id):
-        c = self.conn.cursor()
-        data = (str(player_id),)
-        c.execute('REMOVE players where id=(?)', data)
-        self.conn.commit() 
+            self.invalidate(player_id)
 
-    def get_player(self, player_id):
-        c = self.conn.cursor()
+    async def insert_player(self, player_id):
+        await self.insert_bulk([player_id])
+
+    async def remove_player(self, player_id):
         data = (str(player_id),)
-        c.execute('SELECT * from players where id=?', data)
-        self.conn.commit()
-        return c.fetchone()
+        await self.connection.execute('DELETE FROM players where id=(?)', data)
+        self.invalidate(player_id)
+
+    async def get_player(self, player_id):
+        key = str(player_id)
+        player = self.cache.get(key)
+        if player is not None:
+            self.cache.move_to_end(key)
+            return player
+
+        player = await self.connection.fetchone('SELECT * from players where id=?', (key,))
+        # unknown players are not cached, they are inserted before they play
+        if player is not None:
+            self.cache[key] = player
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return player
+
+    async def get_emojis(self):
+        '''
+        every distinct emoji players have picked
+        '''
+        rows = await self.connection.fetchall('SELECT DISTINCT emoji FROM players WHERE emoji IS NOT NULL')
+        return [emoji for emoji, in rows]
+
+    def invalidate(self, player_id):
+        self.cache.pop(str(player_id), None)
 
-    def update_player_emoji(self, player_id, emoji):
-        c = self.conn.cursor()
+    async def update_player_emoji(self, player_id, emoji):
         data = (emoji, str(player_id),)
-        c.execute('UPDATE players SET emoji=? where id=?', data)
-        self.conn.commit()
+        await self.connection.execute('UPDATE players SET emoji=? where id=?', data)
+        self.invalidate(player_id)
 
-    def update_player_color(self, player_id, color):
-        c = self.conn.cursor()
+    async def update_player_color(self, player_id, color):
         data = (color, str(player_id),)
-        c.execute('UPDATE players SET emoji=? where id=?', data)
-        self.conn.commit()
\ No newline at end of file
+        await self.connection.execute('UPDATE players SET color=? where id=?', data)
+        self.invalidate(player_id)
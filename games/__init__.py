@@ -1,11 +1,22 @@
-from .connect4 import Connect4
-from .go import Go, MockGo
-
-GAMES = {
-    'connect4': Connect4,
-    'go': Go
-}
-
-MOCK = {
-    'go': MockGo
-}
\ No newline at end of file
+# the game modules pull in discord, PIL and boto3. they are loaded on first
+# access so the rules engines can be imported on their own, e.g. by benchmarks
+def __getattr__(name):
+    if name == 'Connect4':
+        from .connect4 import Connect4
+        return Connect4
+    if name in ('Go', 'MockGo'):
+        from . import go
+        return getattr(go, name)
+    if name == 'GAMES':
+        from .connect4 import Connect4
+        from .go import Go
+        return {
+            'connect4': Connect4,
+            'go': Go
+        }
+    if name == 'MOCK':
+        from .go import MockGo
+        return {
+            'go': MockGo
+        }
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
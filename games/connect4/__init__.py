@@ -1 +1,6 @@
-from .connect4 import Connect4
\ No newline at end of file
+# see games/__init__.py, connect4.py is loaded on first access
+def __getattr__(name):
+    if name == 'Connect4':
+        from .connect4 import Connect4
+        return Connect4
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
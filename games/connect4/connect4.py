@@ -1,7 +1,13 @@
+import uuid
 import discord
 import random
 
+from . import solver
+from .logic import bitboard, PRIMARY, TERTIARY
+from utils.executor import run_in_process
+
 class Connect4():
+    NAME = 'connect4'
     BOARD_X = 7
     BOARD_Y = 6
     BUTTONS = {'1️⃣':0,'2️⃣':1,'3️⃣':2,'4️⃣':3,'5️⃣':4,'6️⃣':5,'7️⃣':6}
@@ -11,11 +17,18 @@ class Connect4():
     TERTIARY_TILE = "🔵"
     PRIMARY_COLOR = (255,175,44)
     TERTIARY_COLOR = (84,174,239)
+    DIFFICULTIES = solver.DIFFICULTIES
 
-    def __init__(self, session_id, client, db, channel, message, primary, tertiary):
+    def __init__(self, session_id, client, db, channel, message, primary, tertiary, difficulty='medium', journal=None):
+        if difficulty not in self.DIFFICULTIES:
+            raise ValueError(f"difficulty must be one of {', '.join(self.DIFFICULTIES)}")
+        self.id = uuid.uuid4()
         self.session_id = session_id
         self.client = client
         self.db = db
+        self.journal = journal
+        # constructor options a restored session is rebuilt with
+        self.options = {'difficulty': difficulty}
         self.channel = channel
         self.message = message
         self.primary = primary
@@ -23,17 +36,17 @@ class Connect4():
         self.has_buttons = False
         self.winner = None
         self.lock = False
+        # set once the session is removed, the game takes no more moves
+        self.ended = False
+        self.difficulty = difficulty
 
         self.initialize_helper()
 
     def initialize_helper(self):
-        self.board = [[None,None,None,None,None,None,None],
-                      [None,None,None,None,None,None,None],
-                      [None,None,None,None,None,None,None],
-                      [None,None,None,None,None,None,None],
-                      [None,None,None,None,None,None,None],
-                      [None,None,None,None,None,None,None]]
+        self.board = bitboard()
         self.current_player = random.choice([self.primary, self.tertiary]) if self.tertiary != self.client.user else self.primary
+        self.current_slot = PRIMARY if self.current_player == self.primary else TERTIARY
+        self.first_player = self.current_player
 
     def is_player_current(self, player):
         return self.current_player == player
@@ -41,67 +54,96 @@ class Connect4():
     def is_completed(self):
         return True if self.winner else False
 
-    def on_complete(self):
-        pass
+    def is_draw(self):
+        return not self.winner and self.board.is_full()
+
+    @property
+    def move_count(self):
+        return self.board.moves
+
+    async def on_complete(self):
+        self.ended = True
+
+    async def restore(self, first_id, moves, sub_message=None):
+        '''
+        replays a journaled game without rendering, the message still shows
+        the last board
+        '''
+        self.board = bitboard()
+        self.current_player = self.primary if self.primary.id == first_id else self.tertiary
+        self.current_slot = PRIMARY if self.current_player == self.primary else TERTIARY
+        self.first_player = self.current_player
+        for _, _, col in moves:
+            if not self.board.can_play(col):
+                raise ValueError(f"journaled move {col} is not legal")
+            self.drop_piece(col)
+        self.has_buttons = True
 
     async def play_move(self, payload):
         await self.message.remove_reaction(payload.emoji, payload.member)
         col = self.BUTTONS[payload.emoji.name]
 
         ret_val = False
-        for y in range(5,-1,-1):
-            if not self.board[y][col]:
-                self.board[y][col] = payload.member.id
-                if self.detect_current_player_win():
-                    self.winner = self.current_player
-                else:
-                    self.current_player = self.primary if self.is_player_current(self.tertiary) else self.tertiary
-                await self.render_message()
-                ret_val = True
-                break
-
-        # bot AI code
-        if self.tertiary.id == self.client.user.id and self.is_player_current(self.tertiary):
-            cols = list(self.BUTTONS.values())
-            random.shuffle(cols)
-            escape = False
-            for col in cols:
-                if escape:
-                    break
-                for y in range(5,-1,-1):
-                    if not self.board[y][col]:
-                        self.board[y][col] = self.tertiary.id
-                        if self.detect_current_player_win():
-                            self.winner = self.current_player
-                        else:
-                            self.current_player = self.primary if self.is_player_current(self.tertiary) else self.tertiary
-                        await self.render_message()
-                        escape = True
-                        break
+        if self.board.can_play(col):
+            await self.play_piece(col)
+            ret_val = True
+
+        if self.is_bot_turn():
+            await self.play_bot_move()
 
         return ret_val
 
+    def is_bot_turn(self):
+        return self.tertiary.id == self.client.user.id and self.is_player_current(self.tertiary) and not self.winner and not self.ended
+
+    # bot AI code
+    async def play_bot_move(self):
+        if self.board.playable_columns():
+            self.lock = True
+            depth, budget = self.DIFFICULTIES[self.difficulty]
+            # a failed search must not leave the game locked for good
+            try:
+                # search in the process pool so other games keep reacting
+                col = await run_in_process(solver.best_move, self.board, self.current_slot, depth, budget)
+                # the session was removed while the bot was thinking
+                if not self.ended:
+                    await self.play_piece(col)
+            finally:
+                self.lock = False
+
+    async def play_piece(self, col):
+        slot = self.current_slot
+        self.drop_piece(col)
+        # a removed session's moves are already deleted, nothing is added
+        if self.journal and not self.ended:
+            await self.journal.record_move(self.id, self.board.moves - 1, slot, None, col)
+        await self.render_message()
+
+    def drop_piece(self, col):
+        self.board.play(col, self.current_slot)
+        if self.detect_current_player_win():
+            self.winner = self.current_player
+        else:
+            self.current_player = self.primary if self.is_player_current(self.tertiary) else self.tertiary
+            self.current_slot = TERTIARY if self.current_slot == PRIMARY else PRIMARY
+
     async def render_message(self):
         if not self.winner:
             header = f"It's your move, {self.current_player.name}"
         else:
             header = f"Congratulations, {self.winner.name}"
-        container = discord.Embed(title=header, color=self.get_container_color())
-        container.add_field(name=self.render_board(), value="⠀", inline=True)
+        container = discord.Embed(title=header, color=await self.get_container_color())
+        container.add_field(name=await self.render_board(), value="⠀", inline=True)
         await self.message.edit(content=f"{self.primary.mention} ⚔️ {self.tertiary.mention}", embed=container)
         await self.refresh_buttons()
     
-    def render_board(self):
-        primary_tile, tertiary_tile = self.get_player_emojis()
+    async def render_board(self):
+        primary_tile, tertiary_tile = await self.get_player_emojis()
+        tiles = {PRIMARY: primary_tile, TERTIARY: tertiary_tile, None: self.BLANK_TILE}
         ret = ""
-        for y in self.board:
-            for tile in y:
-                if tile is self.primary.id:
-                    ret += f"{primary_tile}\t\t"
-                elif tile is self.tertiary.id:
-                    ret += f"{tertiary_tile}\t\t"
-                else:
-                    ret += f"{self.BLANK_TILE}\t\t"
+        for row in range(self.BOARD_Y):
+            for col in range(self.BOARD_X):
+                ret += f"{tiles[self.board.cell(row, col)]}\t\t"
             ret += "\n\n\n"
         if not self.winner:
             ret += '\t\t'.join(self.BUTTONS.keys())
@@ -119,40 +161,20 @@ class Connect4():
 
 
     def detect_current_player_win(self):
-        for col in range(0, self.BOARD_X-3):
-            for row in range(0, self.BOARD_Y):
-                if self.board[row][col] == self.board[row][col+1] == self.board[row][col+2] == self.board[row][col+3] == self.current_player.id:
-                    return True
-
-        for row in range(0, self.BOARD_Y-3):
-            for col in range(0, self.BOARD_X):
-                if self.board[row][col] == self.board[row+1][col] == self.board[row+2][col] == self.board[row+3][col] == self.current_player.id:
-                    return True
-
-        for row in range(3, self.BOARD_Y):
-            for col in range(0, self.BOARD_X-3):
-                if self.board[row][col] == self.board[row-1][col+1] == self.board[row-2][col+2] == self.board[row-3][col+3] == self.current_player.id:
-                    return True
-
-        for row in range(3, self.BOARD_Y):
-            for col in range(3, self.BOARD_X):
-                if self.board[row][col] == self.board[row-1][col-1] == self.board[row-2][col-2] == self.board[row-3][col-3] == self.current_player.id:
-                    return True
-
-        return False
-
-    def get_container_color(self):
-        db_primary = self.db.get_player(self.primary.id)
-        db_tertiary = self.db.get_player(self.tertiary.id)
+        return self.board.is_win(self.current_slot)
+
+    async def get_container_color(self):
+        db_primary = await self.db.get_player(self.primary.id)
+        db_tertiary = await self.db.get_player(self.tertiary.id)
         primary_color = db_primary[2] if db_primary[2] else self.PRIMARY_COLOR
         tertiary_color = db_tertiary[2] if db_tertiary[2] else self.TERTIARY_COLOR
         return discord.Color.from_rgb(*primary_color) if \
             self.current_player == self.primary \
             else discord.Color.from_rgb(*tertiary_color)
 
-    def get_player_emojis(self):
-        db_primary = self.db.get_player(self.primary.id)
-        db_tertiary = self.db.get_player(self.tertiary.id)
+    async def get_player_emojis(self):
+        db_primary = await self.db.get_player(self.primary.id)
+        db_tertiary = await self.db.get_player(self.tertiary.id)
         primary_tile = db_primary[1] if db_primary[1] else self.PRIMARY_TILE
         tertiary_tile = db_tertiary[1] if db_tertiary[1] else self.TERTIARY_TILE
         return primary_tile, tertiary_tile
@@ -0,0 +1,69 @@
+PRIMARY = 0
+TERTIARY = 1
+
+WIDTH = 7
+HEIGHT = 6
+# every column gets one spare bit on top so shifts never wrap into the next column
+COLUMN_BITS = HEIGHT + 1
+# vertical, horizontal and both diagonals
+DIRECTIONS = (1, COLUMN_BITS, COLUMN_BITS - 1, COLUMN_BITS + 1)
+
+class bitboard():
+    '''
+    connect 4 board as one integer per player. bit `col * 7 + row` is set
+    when that player has a piece in col, counting rows up from the bottom
+    '''
+    def __init__(self):
+        self.boards = [0, 0]
+        self.heights = [col * COLUMN_BITS for col in range(WIDTH)]
+        self.moves = 0
+
+    def __copy__(self):
+        cls = self.__class__
+        copy = cls.__new__(cls)
+        copy.boards = self.boards[:]
+        copy.heights = self.heights[:]
+        copy.moves = self.moves
+        return copy
+
+    @property
+    def mask(self):
+        return self.boards[PRIMARY] | self.boards[TERTIARY]
+
+    def can_play(self, col):
+        return self.heights[col] < col * COLUMN_BITS + HEIGHT
+
+    def playable_columns(self):
+        return [col for col in range(WIDTH) if self.can_play(col)]
+
+    def is_full(self):
+        return self.moves == WIDTH * HEIGHT
+
+    def play(self, col, player):
+        self.boards[player] |= 1 << self.heights[col]
+        self.heights[col] += 1
+        self.moves += 1
+
+    def undo(self, col, player):
+        self.heights[col] -= 1
+        self.boards[player] ^= 1 << self.heights[col]
+        self.moves -= 1
+
+    def is_win(self, player):
+        board = self.boards[player]
+        for shift in DIRECTIONS:
+            pairs = board & (board >> shift)
+            if pairs & (pairs >> (2 * shift)):
+                return True
+        return False
+
+    def cell(self, row, col):
+        '''
+        owner of row (counted from the top, as rendered) and col, or None
+        '''
+        bit = 1 << (col * COLUMN_BITS + HEIGHT - 1 - row)
+        if self.boards[PRIMARY] & bit:
+            return PRIMARY
+        if self.boards[TERTIARY] & bit:
+            return TERTIARY
+        return None
@@ -0,0 +1,143 @@
+import time
+from collections import OrderedDict
+
+from .logic import WIDTH, HEIGHT, COLUMN_BITS, PRIMARY, TERTIARY
+
+# search the center columns first, they take part in the most lines
+COLUMN_ORDER = sorted(range(WIDTH), key=lambda col: abs(col - WIDTH // 2))
+CENTER_MASK = ((1 << HEIGHT) - 1) << (WIDTH // 2 * COLUMN_BITS)
+# well clear of any heuristic score
+WIN_SCORE = 1000
+
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+DIFFICULTIES = {
+    # name: (max depth, seconds)
+    'easy': (2, None),
+    'medium': (6, None),
+    'hard': (WIDTH * HEIGHT, 1.0),
+}
+# entries kept per process, every pool worker holds its own table. a hard
+# game adds 5-10k entries at ~200 bytes each, this keeps a few games' worth
+TABLE_SIZE = 1 << 16
+
+class lru_table():
+    '''
+    transposition table that forgets the least recently used positions
+    once it holds `capacity` entries
+    '''
+    def __init__(self, capacity=TABLE_SIZE):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+# one table per process, kept between moves and between games
+_table = lru_table()
+
+class searchTimeout(Exception):
+    pass
+
+def other(player):
+    return TERTIARY if player == PRIMARY else PRIMARY
+
+def position_key(board, player):
+    # the player to move's pieces plus the occupancy mask identify a position
+    return board.boards[player] + board.mask
+
+def evaluate(board, player):
+    return bin(board.boards[player] & CENTER_MASK).count('1') - \
+        bin(board.boards[other(player)] & CENTER_MASK).count('1')
+
+def negamax(board, player, depth, alpha, beta, deadline):
+    '''
+    score of the position for the player to move, higher is better. wins
+    score more the sooner they happen
+    '''
+    if deadline and time.perf_counter() > deadline:
+        raise searchTimeout
+
+    moves = [col for col in COLUMN_ORDER if board.can_play(col)]
+    if not moves:
+        return 0
+    for col in moves:
+        board.play(col, player)
+        won = board.is_win(player)
+        board.undo(col, player)
+        if won:
+            return WIN_SCORE - board.moves
+    if depth == 0:
+        return evaluate(board, player)
+
+    alpha_original = alpha
+    key = position_key(board, player)
+    entry = _table.get(key)
+    if entry is not None and entry[0] >= depth:
+        _, flag, value = entry
+        if flag == EXACT:
+            return value
+        if flag == LOWER:
+            alpha = max(alpha, value)
+        elif flag == UPPER:
+            beta = min(beta, value)
+        if alpha >= beta:
+            return value
+
+    best = -WIN_SCORE
+    for col in moves:
+        board.play(col, player)
+        try:
+            value = -negamax(board, other(player), depth - 1, -beta, -alpha, deadline)
+        finally:
+            board.undo(col, player)
+        if value > best:
+            best = value
+        alpha = max(alpha, value)
+        if alpha >= beta:
+            break
+
+    flag = UPPER if best <= alpha_original else LOWER if best >= beta else EXACT
+    _table.put(key, (depth, flag, best))
+    return best
+
+def best_move(board, player, depth, budget=None):
+    '''
+    iterative deepening up to `depth` plies, stopping early once `budget`
+    seconds have passed. returns the best column of the deepest finished search
+    '''
+    deadline = time.perf_counter() + budget if budget else None
+    moves = [col for col in COLUMN_ORDER if board.can_play(col)]
+    choice = moves[0] if moves else None
+
+    for current_depth in range(1, depth + 1):
+        try:
+            best, best_value = None, -WIN_SCORE - 1
+            for col in moves:
+                board.play(col, player)
+                try:
+                    if board.is_win(player):
+                        return col
+                    value = -negamax(board, other(player), current_depth - 1, -WIN_SCORE, -best_value, deadline)
+                finally:
+                    board.undo(col, player)
+                if value > best_value:
+                    best, best_value = col, value
+        except searchTimeout:
+            break
+        choice = best
+        # a forced win or loss does not change with more depth
+        if abs(best_value) >= WIN_SCORE - WIDTH * HEIGHT:
+            break
+    return choice
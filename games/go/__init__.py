@@ -1,2 +1,9 @@
-from .go import Go
-from .mock import MockGo
\ No newline at end of file
+# see games/__init__.py, go.py and mock.py are loaded on first access
+def __getattr__(name):
+    if name == 'Go':
+        from .go import Go
+        return Go
+    if name == 'MockGo':
+        from .mock import MockGo
+        return MockGo
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
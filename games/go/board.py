@@ -0,0 +1,238 @@
+from functools import lru_cache
+
+from utils.hash import zobrist_table
+
+EMPTY = 0
+BLACK = 1
+WHITE = 2
+
+def opponent(color):
+    return BLACK + WHITE - color
+
+@lru_cache(maxsize=None)
+def neighbour_table(size):
+    # orthogonal neighbours of every point, computed once per board size
+    table = []
+    for point in range(size * size):
+        row, col = divmod(point, size)
+        neighbours = []
+        if row > 0:
+            neighbours.append(point - size)
+        if col < size - 1:
+            neighbours.append(point + 1)
+        if row < size - 1:
+            neighbours.append(point + size)
+        if col > 0:
+            neighbours.append(point - 1)
+        table.append(tuple(neighbours))
+    return tuple(table)
+
+class goban():
+    '''
+    flat board of `size * size` cells. point = row * size + col
+
+    stones are grouped into chains with a union-find (`parent`) and a
+    circular linked list of members (`next_stone`). every chain root keeps
+    the set of its liberties so capture and suicide checks never flood fill,
+    and the xor of its stones' zobrist keys so the hash of any resulting
+    position is known before a move is played
+    '''
+    def __init__(self, size):
+        self.size = size
+        self.cells = bytearray(size * size)
+        self.neighbours = neighbour_table(size)
+        self.keys = zobrist_table(size * size)
+        self.hash = 0
+        self.parent = list(range(size * size))
+        self.next_stone = list(range(size * size))
+        self.liberties = {}
+        self.chain_hash = {}
+        # stones of each color taken off the board
+        self.prisoners = [0, 0, 0]
+
+    def __copy__(self):
+        cls = self.__class__
+        copy = cls.__new__(cls)
+        copy.size = self.size
+        copy.cells = self.cells[:]
+        copy.neighbours = self.neighbours
+        copy.keys = self.keys
+        copy.hash = self.hash
+        copy.parent = self.parent[:]
+        copy.next_stone = self.next_stone[:]
+        copy.liberties = {root: set(liberties) for root, liberties in self.liberties.items()}
+        copy.chain_hash = dict(self.chain_hash)
+        copy.prisoners = self.prisoners[:]
+        return copy
+
+    def __getstate__(self):
+        # the lookup tables are shared per size, rebuild them instead of pickling
+        state = dict(self.__dict__)
+        del state['neighbours']
+        del state['keys']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.neighbours = neighbour_table(self.size)
+        self.keys = zobrist_table(self.size * self.size)
+
+    def point(self, row, col):
+        return row * self.size + col
+
+    def coords(self, point):
+        return divmod(point, self.size)
+
+    def __getitem__(self, point):
+        return self.cells[point]
+
+    def __len__(self):
+        return len(self.cells)
+
+    def find(self, point):
+        parent = self.parent
+        while parent[point] != point:
+            parent[point] = parent[parent[point]]
+            point = parent[point]
+        return point
+
+    def chain(self, point):
+        '''
+        yields every stone in the chain containing point
+        '''
+        stone = point
+        while True:
+            yield stone
+            stone = self.next_stone[stone]
+            if stone == point:
+                break
+
+    def liberty_count(self, point):
+        return len(self.liberties[self.find(point)])
+
+    def atari_chains(self, point, color):
+        '''
+        roots of the chains of `color` next to point whose last liberty is point
+        '''
+        roots = []
+        for n in self.neighbours[point]:
+            if self.cells[n] == color:
+                root = self.find(n)
+                if root not in roots and len(self.liberties[root]) == 1:
+                    roots.append(root)
+        return roots
+
+    def hash_after(self, point, color, captures):
+        '''
+        zobrist hash of the position after color plays point capturing `captures`
+        '''
+        key = self.hash ^ self.keys[color][point]
+        for root in captures:
+            key ^= self.chain_hash[root]
+        return key
+
+    def is_suicide(self, point, color):
+        '''
+        True if an empty point would leave its own chain without liberties
+        and capture nothing
+        '''
+        cells = self.cells
+        liberties = self.liberties
+        for n in self.neighbours[point]:
+            value = cells[n]
+            if value == EMPTY:
+                return False
+            count = len(liberties[self.find(n)])
+            if value == color:
+                if count > 1:
+                    return False
+            elif count == 1:
+                return False
+        return True
+
+    def is_legal(self, point, color, positions=()):
+        '''
+        True if color may play point: empty, not suicide, and not recreating
+        any hash in positions. never changes the board
+        '''
+        if self.cells[point] != EMPTY:
+            return False
+        captures = self.atari_chains(point, opponent(color))
+        if not captures and self.is_suicide(point, color):
+            return False
+        return not positions or self.hash_after(point, color, captures) not in positions
+
+    def legal_moves(self, color, positions=()):
+        '''
+        bytearray with 1 at every point color may play and 0 everywhere else
+        '''
+        is_legal = self.is_legal
+        return bytearray(is_legal(point, color, positions) for point in range(len(self.cells)))
+
+    def place(self, point, color):
+        '''
+        puts a stone on an empty point, merging it into neighbouring chains.
+        returns the roots of enemy chains left without liberties
+        '''
+        cells = self.cells
+        parent = self.parent
+        next_stone = self.next_stone
+        liberties = self.liberties
+        chain_hash = self.chain_hash
+
+        key = self.keys[color][point]
+        self.hash ^= key
+        cells[point] = color
+        parent[point] = point
+        next_stone[point] = point
+        liberties[point] = {n for n in self.neighbours[point] if cells[n] == EMPTY}
+        chain_hash[point] = key
+
+        root = point
+        captures = []
+        for n in self.neighbours[point]:
+            value = cells[n]
+            if value == EMPTY:
+                continue
+            other = self.find(n)
+            if value == color:
+                if other == root:
+                    continue
+                # union by liberty set size, splice the member lists together
+                merged = liberties.pop(other)
+                current = liberties.pop(root)
+                if len(merged) < len(current):
+                    root, other = other, root
+                    merged, current = current, merged
+                merged |= current
+                parent[other] = root
+                next_stone[root], next_stone[other] = next_stone[other], next_stone[root]
+                liberties[root] = merged
+                chain_hash[root] = chain_hash.pop(root) ^ chain_hash.pop(other)
+            else:
+                enemy = liberties[other]
+                enemy.discard(point)
+                if not enemy and other not in captures:
+                    captures.append(other)
+        liberties[root].discard(point)
+        return captures
+
+    def remove_chain(self, root):
+        '''
+        takes a whole chain off the board, returning the points it occupied
+        '''
+        cells = self.cells
+        removed = list(self.chain(root))
+        self.prisoners[cells[root]] += len(removed)
+        for stone in removed:
+            cells[stone] = EMPTY
+        root = self.find(root)
+        del self.liberties[root]
+        self.hash ^= self.chain_hash.pop(root)
+        for stone in removed:
+            self.parent[stone] = stone
+            self.next_stone[stone] = stone
+            for n in self.neighbours[stone]:
+                if cells[n] != EMPTY:
+                    self.liberties[self.find(n)].add(stone)
+        return removed
@@ -1,5 +1,3 @@
-from utils.hash import z_order_hash
-
 class tile():
     def __init__(self, row, col, state=None, owner=None):
         self.row = row
@@ -69,7 +67,7 @@ class stone(tile):
         ))
 
     def __hash__(self):
-        return z_order_hash(self.row, self.col)
+        return hash((self.row, self.col))
 
     def __eq__(self, other):
         return isinstance(other, stone) and \
@@ -83,4 +81,30 @@ class wall(tile):
             col=col,
             state=None,
             owner=None
-        )
\ No newline at end of file
+        )
+
+class board_view():
+    '''
+    read-only `board[row][col]` adapter over the flat goban for callers
+    that still expect a grid of tile/stone objects
+    '''
+    def __init__(self, state):
+        self.state = state
+
+    def __len__(self):
+        return self.state.goban.size
+
+    def __getitem__(self, row):
+        if row < 0 or row >= len(self):
+            raise IndexError(row)
+        return [self.get_tile(row, col) for col in range(len(self))]
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+    def get_tile(self, row, col):
+        color = self.state.goban[self.state.goban.point(row, col)]
+        if color:
+            return stone(row=row, col=col, owner=self.state.players[color], state=self.state)
+        return tile(row=row, col=col)
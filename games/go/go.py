@@ -1,4 +1,5 @@
 import os
+import re
 import copy
 import uuid
 import random
@@ -8,20 +9,38 @@ import discord
 import asyncio
 import pathlib
 import datetime
+from io import BytesIO
 
+from . import mcts
 from .logic import ruleset
-from .render import GobanRenderer
+from .board import BLACK, WHITE, opponent
+from .scoring import AREA
+from .entities import board_view
+from .render import GobanRenderer, BoardFrame
+from .replay import build_replay
 
 import s3
-from utils.image import export_replay
+from utils.executor import run_in_render_pool
 
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
 
 CACHE_DIRECTORY = os.getenv('CACHE_DIRECTORY')
 
+# boards are embedded from object storage, or attached to the message itself
+STORAGE = 'storage'
+ATTACHMENT = 'attachment'
+IMAGE_DELIVERY = os.getenv('IMAGE_DELIVERY', STORAGE)
+
+def delivery_mode(mode):
+    if mode not in (STORAGE, ATTACHMENT):
+        raise ValueError(f"IMAGE_DELIVERY must be {STORAGE} or {ATTACHMENT}")
+    return mode
+
 class Go():
+    NAME = 'go'
     BOARD_X = 9
     BOARD_Y = 9
+    BOARD_SIZES = (9, 13, 19)
     BUTTONS_ROW = {'1️⃣':0,'2️⃣':1,'3️⃣':2,'4️⃣':3,'5️⃣':4,'6️⃣':5,'7️⃣':6,'8️⃣':7,'9️⃣':8}
     BUTTONS_COL = {'🇦':0,'🇧':1,'🇨':2,'🇩':3,'🇪':4,'🇫':5,'🇬':6,'🇭':7,'🇮':8}
     WINNER_BUTTONS = {'🎉':0,'🥳':1,'🇺':2,'🎊':3,'🇼':4,'🇴':5,'🇳':6, '❕':7, '🍾':8}
@@ -30,35 +49,87 @@ class Go():
     BLACK_TILE = "⚫"
     WHITE_COLOR = (255,255,255)
     BLACK_COLOR = (0,0,0)
+    KOMI = 6.5
+    BOT_ENABLED = True
+    BOT_BUDGET = 3.0 # seconds of search per bot move
+    DELIVERY = IMAGE_DELIVERY
+    REPLAY_QUALITY = 80
+    REPLAY_CONFIG = {} # GameStateRenderer settings for replay frames, e.g. max_width
     SUB_MESSAGE = "`Select a row and a column`"
+    TYPED_SUB_MESSAGE = "`Type >move followed by a row and a column, e.g. >move 4D`"
+    COORDINATE_PATTERN = re.compile(r'^\s*(?:(\d{1,2})\s*([a-z])|([a-z])\s*(\d{1,2}))\s*$', re.IGNORECASE)
     BACKGROUND_PATH = "games/go/assets/kaya.jpg"
 
-    def __init__(self, session_id, client, db, channel, message, primary, tertiary, verbose=False):
+    def __init__(self, session_id, client, db, channel, message, primary, tertiary, verbose=False, board_size=9, journal=None):
+        if board_size not in self.BOARD_SIZES:
+            raise ValueError(f"board size must be one of {self.BOARD_SIZES}")
         self.id = uuid.uuid4()
+        self.BOARD_X = board_size
+        self.BOARD_Y = board_size
+        # reaction buttons only go up to 9x9, larger boards take typed coordinates
+        self.has_button_input = board_size <= len(self.BUTTONS_ROW)
+        if not self.has_button_input:
+            self.SUB_MESSAGE = self.TYPED_SUB_MESSAGE
         self.session_id = session_id
         self.client = client
         self.db = db
+        self.journal = journal
+        # constructor options a restored session is rebuilt with
+        self.options = {'board_size': board_size}
         self.channel = channel
         self.message = message
         self.message_map = {self.message.id: self.message}
         self.primary = primary
         self.tertiary = tertiary
         self.verbose = verbose
+        self.has_bot = self.BOT_ENABLED and tertiary.id == client.user.id
         self.has_buttons = False
         self.has_played = False
         self.winner = None
         self.row_selection = None
         self.col_selection = None
         self.last_state = None
+        self.passes = 0
+        self.komi = self.KOMI
+        self.scoring = AREA
+        self.dead_stones = set()
+        # two passes in a row stop play until both players accept the dead
+        # stones, or one of them resumes
+        self.scoring_phase = False
+        self.accepted = set()
         self.lock = False
+        self.render_lock = asyncio.Lock()
+        self.frame = BoardFrame()
+        self.dirty = set()
+        self.board_key = None
+        self.board_final = False
+        # set once the session is removed, the game takes no more moves
+        self.ended = False
+        self.delivery = delivery_mode(self.DELIVERY)
+        # (color, row, col) per move, row and col are None for a pass
+        self.move_log = []
+        # moves and dead stone marks written to the journal so far
+        self.journaled = 0
         self.emoji_directory= f'{CACHE_DIRECTORY}/emoji'
         self.assets_directory = f'{CACHE_DIRECTORY}/go/{self.session_id}/{self.id}'
 
         self.initialize_helper()
 
     def initialize_helper(self):
-        player_order = random.sample([self.primary, self.tertiary],2) # random player order
+        # random player order, challengers always open against the bot
+        player_order = random.sample([self.primary, self.tertiary],2) if not self.has_bot else [self.primary, self.tertiary]
+        self.assign_colors(player_order)
+        pathlib.Path(self.emoji_directory).mkdir(parents=True, exist_ok=True)
+        pathlib.Path(self.assets_directory).mkdir(parents=True, exist_ok=True)
+
+    def assign_colors(self, player_order):
+        # black opens, the board starts over
         self.current_player = player_order[0]
+        self.current_color = BLACK
+        self.players = {
+            BLACK: player_order[0],
+            WHITE: player_order[1]
+        }
         self.team_skin = {
             player_order[0].id: {
                 'tile': self.BLACK_TILE,
@@ -69,9 +140,8 @@ class Go():
                 'color': self.WHITE_COLOR
             }
         }
-        self.board = ruleset.initialize_board(self)
-        pathlib.Path(self.emoji_directory).mkdir(parents=True, exist_ok=True)
-        pathlib.Path(self.assets_directory).mkdir(parents=True, exist_ok=True)
+        self.goban = ruleset.initialize_board(self)
+        self.positions = {self.goban.hash}
 
     async def initialize_sub_message(self, message):
         self.sub_message = message
@@ -80,12 +150,43 @@ class Go():
     def is_completed(self):
         return True if self.winner else False
 
+    def is_playing(self):
+        # stones and passes are only taken before scoring or the end
+        return not self.winner and not self.ended and not self.scoring_phase
+
+    def is_draw(self):
+        # ruleset.leader breaks ties, a finished game always has a winner
+        return False
+
+    @property
+    def move_count(self):
+        return len(self.move_log)
+
     async def on_complete(self):
+        self.ended = True
+        if not self.winner:
+            # the board shows a live frame that other games may share and
+            # delete, swap in the final frame, which no live game shows
+            await self.render_message()
+        # the message keeps showing the final frame, only the index lets go of it
+        if self.delivery == STORAGE:
+            self.release_board()
+            self.board_key = None
         if self.has_played:
             timestamp = datetime.datetime.now().isoformat()
             filename = f'{self.primary.id}-{self.tertiary.id}-{timestamp}.mp4'
             full_path = f"{self.assets_directory}/{filename}"
-            export_replay(self.assets_directory, filename)
+            await build_replay(
+                output_path=full_path,
+                board_size=self.BOARD_X,
+                moves=self.move_log,
+                players={color: player.id for color, player in self.players.items()},
+                primary=self.primary.id,
+                emojis=await self.get_player_emojis(),
+                finished=self.is_completed(),
+                quality=self.REPLAY_QUALITY,
+                config=self.REPLAY_CONFIG
+            )
             video = discord.File(full_path, filename=filename)
             await self.channel.send(f"{self.primary.mention} ⚔️ {self.tertiary.mention} match summary", file=video)
 
@@ -96,15 +197,24 @@ class Go():
     def other_player(self):
         return self.primary if self.current_player == self.tertiary else self.tertiary
 
+    @property
+    def board(self):
+        return board_view(self)
+
     async def play_move(self, payload):
-        if payload.message_id == self.message.id:
+        if not self.has_button_input or not self.is_playing():
+            return
+
+        if payload.message_id == self.message.id and payload.emoji.name in self.BUTTONS_ROW:
             # make row selection
             self.row_selection = self.BUTTONS_ROW[payload.emoji.name]
             not self.verbose and await self.message.remove_reaction(payload.emoji, payload.member)
-        elif payload.message_id == self.sub_message.id:
+        elif payload.message_id == self.sub_message.id and payload.emoji.name in self.BUTTONS_COL:
             # make col selection
             self.col_selection = self.BUTTONS_COL[payload.emoji.name]
             not self.verbose and await self.sub_message.remove_reaction(payload.emoji, payload.member)
+        else:
+            return
 
         # only accept if player makes both a row and col selection
         if (self.row_selection and not self.col_selection) or (self.col_selection and not self.row_selection):
@@ -116,45 +226,259 @@ class Go():
             )
 
         if self.row_selection is not None and self.col_selection is not None:
-            self.lock = True
-            self.has_played = True
-
-            is_valid_placement = ruleset.attempt_placement(self)
-            if not is_valid_placement:
-                await self.sub_message.edit(
-                    content=self.render_selection_state(
-                        'Invalid Placement:',
-                        'Your opponent chose:'
-                    )
-                )
-            if is_valid_placement:
-                # save current state
-                self.last_state = copy.deepcopy((self.current_player.id, self.row_selection, self.col_selection))
+            await self.place_selection()
 
-            # clear current state
+    async def play_coordinate(self, coordinate):
+        if not self.is_playing():
+            return False
+        selection = self.parse_coordinate(coordinate)
+        if not selection:
+            await self.sub_message.edit(
+                content=f"`Invalid coordinate: {coordinate.strip()}`\n{self.TYPED_SUB_MESSAGE}"
+            )
+            return False
+
+        self.row_selection, self.col_selection = selection
+        await self.place_selection()
+        return True
+
+    def parse_coordinate(self, coordinate):
+        match = self.COORDINATE_PATTERN.match(coordinate)
+        if not match:
+            return None
+        row = int(match.group(1) or match.group(4)) - 1
+        col = string.ascii_uppercase.index((match.group(2) or match.group(3)).upper())
+        if not 0 <= row < self.BOARD_Y or not 0 <= col < self.BOARD_X:
+            return None
+        return row, col
+
+    async def place_selection(self):
+        if not self.is_playing():
             self.row_selection = None
             self.col_selection = None
-            
-            if is_valid_placement:
-                # switch players
-                self.current_player = self.primary if self.is_player_current(self.tertiary) else self.tertiary
-                await self.render_message()
+            return
+        self.lock = True
+        self.has_played = True
+
+        is_valid_placement = ruleset.attempt_placement(self)
+        if not is_valid_placement:
+            await self.sub_message.edit(
+                content=self.render_selection_state(
+                    'Invalid Placement:',
+                    'Your opponent chose:'
+                )
+            )
+        if is_valid_placement:
+            self.accept_placement()
+            await self.journal_move()
+
+        # clear current state
+        self.row_selection = None
+        self.col_selection = None
+
+        if is_valid_placement:
+            await self.render_message()
+
+        self.lock = False
+
+        if is_valid_placement and self.is_bot_turn():
+            await self.play_bot_move()
+
+    def accept_placement(self):
+        # save current state, the placement already passed the ruleset
+        self.last_state = (self.current_player.id, self.row_selection, self.col_selection)
+        self.passes = 0
+        self.dead_stones.discard(self.goban.point(self.row_selection, self.col_selection))
+        self.dirty.update(self.changes)
+        self.move_log.append((self.current_color, self.row_selection, self.col_selection))
+        self.switch_players()
 
+    def accept_pass(self):
+        self.passes += 1
+        self.last_state = (self.current_player.id, None, None)
+        self.move_log.append((self.current_color, None, None))
+        if not ruleset.end_game(self):
+            self.switch_players()
+        elif self.has_bot:
+            # the bot cannot agree on dead stones, its games count the board as it stands
+            self.winner = self.players[ruleset.leader(self)]
+        else:
+            self.scoring_phase = True
+            self.accepted = set()
+            self.switch_players()
+
+    def switch_players(self):
+        self.current_player = self.primary if self.is_player_current(self.tertiary) else self.tertiary
+        self.current_color = opponent(self.current_color)
+
+    async def journal_move(self):
+        await self.journal_entry(*self.move_log[-1])
+
+    async def journal_entry(self, color, row, col):
+        # a removed session's entries are already deleted, nothing is added
+        if self.journal and not self.ended:
+            seq = self.journaled
+            self.journaled += 1
+            await self.journal.record_move(self.id, seq, color, row, col)
+
+    @property
+    def first_player(self):
+        return self.players[BLACK]
+
+    async def restore(self, first_id, moves, sub_message=None):
+        '''
+        replays a journaled game through the ruleset without rendering, the
+        message still shows the last board
+        '''
+        if sub_message:
+            await self.initialize_sub_message(sub_message)
+        first, second = (self.primary, self.tertiary) if self.primary.id == first_id else (self.tertiary, self.primary)
+        self.assign_colors([first, second])
+
+        for color, row, col in moves:
+            if color is None and row is None:
+                self.resume()
+                continue
+            if color is None:
+                self.mark_dead(row, col)
+                continue
+            if row is None:
+                self.accept_pass()
+                continue
+            self.row_selection, self.col_selection = row, col
+            if not ruleset.attempt_placement(self):
+                raise ValueError(f"journaled move {row}, {col} is not legal")
+            self.accept_placement()
+        self.row_selection = None
+        self.col_selection = None
+        self.journaled = len(moves)
+        self.has_played = bool(self.move_log)
+        self.has_buttons = True
+
+    def is_bot_turn(self):
+        return self.has_bot and not self.winner and not self.ended and self.current_player.id == self.client.user.id
+
+    async def play_bot_move(self):
+        self.lock = True
+        # a failed search must not leave the game locked for good
+        try:
+            move = await mcts.choose_move(
+                board=self.goban,
+                color=self.current_color,
+                positions=self.positions,
+                komi=self.komi,
+                budget=self.BOT_BUDGET
+            )
+            # the session was removed while the bot was thinking
+            if self.ended:
+                return
+            if move == mcts.PASS:
+                await self.pass_move()
+            else:
+                self.row_selection, self.col_selection = self.goban.coords(move)
+                await self.place_selection()
+        finally:
             self.lock = False
 
+    async def pass_move(self):
+        if not self.is_playing():
+            return
+        self.lock = True
+        self.has_played = True
+        self.accept_pass()
+        await self.journal_move()
+        await self.render_message()
+
+        self.lock = False
+
+        if self.is_bot_turn():
+            await self.play_bot_move()
+
+    async def toggle_dead(self, coordinate, player):
+        selection = self.parse_coordinate(coordinate)
+        board = self.goban
+        if not self.scoring_phase or not selection or not board[board.point(*selection)]:
+            return False
+
+        self.mark_dead(*selection)
+        # changed marks need the other player's agreement again
+        self.accepted = {player.id}
+        # marks change the score, a restored game must see them too
+        await self.journal_entry(None, *selection)
+        await self.render_message()
+        return True
+
+    async def accept_score(self, player):
+        if not self.scoring_phase:
+            return False
+        self.accepted.add(player.id)
+        if {self.primary.id, self.tertiary.id} <= self.accepted:
+            self.scoring_phase = False
+            self.winner = self.players[ruleset.leader(self)]
+        await self.render_message()
+        return True
+
+    async def resume_play(self):
+        if not self.scoring_phase:
+            return False
+        self.resume()
+        await self.journal_entry(None, None, None)
+        await self.render_message()
+        return True
+
+    def resume(self):
+        # the marks are dropped, the player after the second pass moves
+        self.scoring_phase = False
+        self.passes = 0
+        self.dead_stones = set()
+        self.accepted = set()
+
+    def mark_dead(self, row, col):
+        # dead stones are marked a whole chain at a time
+        chain = set(self.goban.chain(self.goban.point(row, col)))
+        if chain <= self.dead_stones:
+            self.dead_stones -= chain
+        else:
+            self.dead_stones |= chain
+
+    def render_score(self):
+        black, white = ruleset.score(self)
+        return f"{self.BLACK_TILE} {black:g} – {self.WHITE_TILE} {white:g} ({self.scoring} scoring, komi {self.komi:g})"
+
     async def render_message(self):
-        board_url = GobanRenderer(self).save()
+        # one render per game at a time so board images never land out of order
+        async with self.render_lock:
+            await self.render_message_helper()
+
+    async def render_message_helper(self):
+        # the snapshot is taken here, drawing and uploading happen off the loop
+        emojis = await self.get_player_emojis()
+        renderer = GobanRenderer(self, emojis, frame=self.frame, dirty=self.dirty, final=self.ended)
+        if self.delivery == ATTACHMENT:
+            if self.verbose:
+                return
+            board_url, attachments = await self.attach_board(renderer)
+        else:
+            board_url, attachments = await self.upload_board(renderer), None
         if not self.verbose:
             await self.refresh_buttons()
-            if not self.winner:
-                header = f"It's your move, {self.current_player.display_name}."
-            else:
+            if self.winner:
                 header = f"Congratulations, {self.winner.name}"
-            container = discord.Embed(title=header, color=self.get_container_color())
+            elif self.ended:
+                header = "This game has ended."
+            elif self.scoring_phase:
+                header = "Mark dead stones with >dead, then >accept the score or >resume play."
+            else:
+                header = f"It's your move, {self.current_player.display_name}."
+            container = discord.Embed(title=header, color=await self.get_container_color())
             container.set_image(url=board_url)
+            container.set_footer(text=self.render_score())
+            # attachments are only replaced when the picture changed
+            files = {'attachments': attachments} if attachments is not None else {}
             await self.message.edit(
                 content=f"{self.primary.mention} ⚔️ {self.tertiary.mention}",
-                embed=container
+                embed=container,
+                **files
             )
             await self.sub_message.edit(
                 content=self.render_selection_state(
@@ -163,8 +487,48 @@ class Go():
                 )
             )
 
+    async def encode_board(self, renderer):
+        # skipped renders leave the frame behind, their cells stay dirty
+        self.dirty = set()
+        try:
+            return await run_in_render_pool(renderer.encode)
+        except Exception:
+            # the frame may be half painted, start over on the next render
+            self.frame.reset()
+            raise
+
+    async def upload_board(self, renderer):
+        key = renderer.key
+        board_url = s3.lookup(key)
+        if not board_url:
+            data, key, content_type = await self.encode_board(renderer)
+            board_url = await s3.upload(data, key, content_type)
+        if board_url and key != self.board_key:
+            s3.retain(key)
+            self.release_board()
+            self.board_key = key
+            self.board_final = renderer.final
+        return board_url
+
+    def release_board(self):
+        # the frame may still be shown by another game. final frames are never
+        # deleted, finished games keep showing them after they are released
+        if self.board_key:
+            s3.release(self.board_key, delete=not self.board_final)
+
+    async def attach_board(self, renderer):
+        # the frame goes up with the message edit, nothing is stored
+        filename = os.path.basename(renderer.key)
+        board_url = f'attachment://{filename}'
+        if renderer.key == self.board_key:
+            return board_url, None
+        data, key, _ = await self.encode_board(renderer)
+        self.board_key = key
+        return board_url, [discord.File(BytesIO(data), filename=filename)]
+
     def render_selection_state(self, selection_message, last_selection_message):
-        return f"\n{self.render_selection(selection_message)}{self.render_last_selection(last_selection_message)}"
+        hint = "" if self.has_button_input else f"{self.TYPED_SUB_MESSAGE}\n"
+        return f"\n{hint}{self.render_selection(selection_message)}{self.render_last_selection(last_selection_message)}"
 
     def render_selection(self, selection_message):
         col = f"{self.row_selection + 1} " if self.row_selection is not None else " "
@@ -179,29 +543,31 @@ class Go():
         else:
             return " "
 
-    def get_container_color(self):
-        db_primary = self.db.get_player(self.primary.id)
-        db_tertiary = self.db.get_player(self.tertiary.id)
+    async def get_container_color(self):
+        db_primary = await self.db.get_player(self.primary.id)
+        db_tertiary = await self.db.get_player(self.tertiary.id)
         primary_color = db_primary[2] if db_primary[2] else self.team_skin[self.primary.id]['color']
         tertiary_color = db_tertiary[2] if db_tertiary[2] else self.team_skin[self.tertiary.id]['color']
         return discord.Color.from_rgb(*primary_color) if \
             self.current_player == self.primary \
             else discord.Color.from_rgb(*tertiary_color)
 
-    def get_player_emojis(self):
-        db_primary = self.db.get_player(self.primary.id)
-        db_tertiary = self.db.get_player(self.tertiary.id)
+    async def get_player_emojis(self):
+        db_primary = await self.db.get_player(self.primary.id)
+        db_tertiary = await self.db.get_player(self.tertiary.id)
         primary_tile = db_primary[1] if db_primary[1] else self.team_skin[self.primary.id]['tile']
         tertiary_tile = db_tertiary[1] if db_tertiary[1] else self.team_skin[self.tertiary.id]['tile']
         return primary_tile, tertiary_tile
 
     async def refresh_buttons(self):
-        if not self.winner and not self.has_buttons:
+        if not self.has_button_input:
+            return
+        if not self.winner and not self.ended and not self.has_buttons:
             for emoji in self.BUTTONS_ROW.keys():
                 await self.message.add_reaction(emoji)
             for emoji in self.BUTTONS_COL.keys():
                 await self.sub_message.add_reaction(emoji)
             self.has_buttons = True
-        elif self.winner:
+        elif self.winner or self.ended:
             await self.message.clear_reactions()
             await self.sub_message.clear_reactions()
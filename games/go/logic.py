@@ -1,136 +1,128 @@
-import copy
-from operator import or_
-from functools import reduce
-
-from .entities import tile, stone
+from .board import goban, EMPTY, BLACK, WHITE, opponent
+from .scoring import score
 
 class ruleset():
     @staticmethod
     def initialize_board(state):
-        return [[tile(row=row, col=col) for col in range(state.BOARD_X)] for row in range(state.BOARD_Y)]
+        return goban(state.BOARD_X)
 
     @staticmethod
     def attempt_placement(state):
         is_valid_placement = False
-        
-        # attempt to place. we need this stone in board state in order to perform checks
-        temp_stone = copy.copy(state.board[state.row_selection][state.col_selection])
-        placement = stone(
-            row=state.row_selection,
-            col=state.col_selection,
-            state=state,
-            owner=state.current_player
-        )
+
+        board = state.goban
+        color = state.current_color
+        point = board.point(state.row_selection, state.col_selection)
+
         captures = []
         try:
             # only accept moves that pass ruleset
             ruleset.validate_placement(
-                board=state.board,
-                owner=state.current_player,
+                board=board,
                 row=state.row_selection,
-                col=state.col_selection,
-                last_state=state.last_state)
-
-            state.board[state.row_selection][state.col_selection] = placement
+                col=state.col_selection)
 
             captures = ruleset.find_captures(
-                board=state.board,
-                owner=state.current_player,
-                root=placement
+                board=board,
+                color=color,
+                root=point
             )
 
             if not captures:
                 ruleset.validate_sacrifice(
-                    board=state.board,
-                    other=state.other_player,
-                    placement=placement
+                    board=board,
+                    color=color,
+                    root=point
                 )
+
+            ruleset.validate_superko(
+                board=board,
+                color=color,
+                root=point,
+                captures=captures,
+                positions=state.positions
+            )
         except placementValidationError:
-            # reset placement if not validated
-            state.board[state.row_selection][state.col_selection] = temp_stone
+            pass
         else:
             is_valid_placement = True
-            ruleset.resolve_captures(
-                board=state.board,
+            board.place(point, color)
+            removed = ruleset.resolve_captures(
+                board=board,
                 captures=captures
             )
+            state.positions.add(board.hash)
+            # cells the renderer has to repaint
+            state.changes = [point, *removed]
         return is_valid_placement
 
+    @staticmethod
+    def legal_moves(state):
+        '''
+        legality mask for the player to move, covering occupied points,
+        suicide and superko. does not change the game
+        '''
+        return state.goban.legal_moves(state.current_color, state.positions)
+
     @staticmethod
     def resolve_captures(board, captures):
+        removed = []
         for capture in captures:
-            board[capture.row][capture.col] = tile(row=capture.row, col=capture.col)
+            removed.extend(board.remove_chain(capture))
+        return removed
 
     @staticmethod
-    def find_captures(board, owner, root):
-        capture_groups = []
-        for dame in root.liberties:
-            if isinstance(dame, stone) and dame.is_not_owned_by(owner):
-                capture_groups.append(ruleset.find_group(board, owner, dame, {dame}))
-
-        captures = []
-        for capture_group in capture_groups:
-            is_captured = True
-            liberties = reduce(or_, [{c for c in capture.liberties} for capture in capture_group])
-            for dame in liberties:
-                # check if has eye
-                if type(dame) is tile:
-                    is_captured = False
-                    break
-
-            if is_captured:
-                captures.extend(capture_group)
-        return captures
+    def find_captures(board, color, root):
+        # enemy chains whose only liberty is the placement
+        return board.atari_chains(root, opponent(color))
 
     @staticmethod
-    def sacrificed_stone(board, other, root):       
-        capture_group = ruleset.find_group(board, other, root, {root})
+    def sacrificed_stone(board, color, root):
+        return board.is_suicide(root, color)
 
-        is_captured = True
-        liberties = reduce(or_, [{dame for dame in capture.liberties} for capture in capture_group])
-        for dame in liberties:
-            if type(dame) is tile:
-                is_captured = False
-                break
-        return is_captured
+    @staticmethod
+    def validate_placement(board, row, col):
+        if ruleset.placed_on_occupied_space(board, row, col):
+           raise placementValidationError
 
     @staticmethod
-    def find_group(board, owner, leaf, captures):
-        for dame in leaf.liberties:
-            if isinstance(dame, stone) and dame.is_not_owned_by(owner) and dame not in captures:
-                captures.add(dame)
-                ruleset.find_group(board, owner, dame, captures)
-        return captures
+    def validate_sacrifice(board, color, root):
+        if ruleset.sacrificed_stone(board, color, root):
+            raise placementValidationError
 
     @staticmethod
-    def validate_placement(board, owner, row, col, last_state):
-        if ruleset.placed_on_occupied_space(board, owner, row, col) or \
-           ruleset.placed_on_previously_played_space(row, col, last_state):
-           raise placementValidationError
-    
+    def placed_on_occupied_space(board, row, col):
+        return board[board.point(row, col)] != EMPTY
+
     @staticmethod
-    def validate_sacrifice(board, other, placement):
-        ret = ruleset.sacrificed_stone(board, other, placement)
-        # print(f"sacrificed_stone - {ret}")
-        if ret:
+    def validate_superko(board, color, root, captures, positions):
+        if ruleset.repeats_position(board, color, root, captures, positions):
             raise placementValidationError
 
     @staticmethod
-    def placed_on_occupied_space(board, owner, row, col):
-        ret = board[row][col] and type(board[row][col]) is stone
-        # print(f"placed_on_occupied_space - {ret} {type(board[row][col])}")
-        return ret
+    def repeats_position(board, color, root, captures, positions):
+        # positional superko: no move may recreate any earlier board position
+        return board.hash_after(root, color, captures) in positions
+
+    @staticmethod
+    def end_game(state):
+        # the game ends once both players pass in a row
+        return state.passes >= 2
 
     @staticmethod
-    def placed_on_previously_played_space(row, col, last_state):
-        ret = (row, col) == (last_state[1], last_state[2]) if last_state else False
-        # print(f"placed_on_previously_played_space - {ret}")
-        return ret
+    def score(state):
+        return score(
+            board=state.goban,
+            komi=state.komi,
+            dead=state.dead_stones,
+            method=state.scoring
+        )
 
     @staticmethod
-    def end_game(current_pass, last_pass_state):
-        return current_pass and last_pass_state
+    def leader(state):
+        black, white = ruleset.score(state)
+        return BLACK if black > white else WHITE
 
 
 class placementValidationError(Exception):
-    pass
\ No newline at end of file
+    pass
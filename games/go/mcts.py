@@ -0,0 +1,209 @@
+import math
+import time
+import random
+import asyncio
+import functools
+from copy import copy
+from collections import Counter
+
+from .board import EMPTY, BLACK, WHITE, opponent
+from utils.executor import process_pool, worker_count
+
+PASS = -1
+# a move is searched in slices of at most this many seconds, so searches of
+# other games and other jobs in the pool take turns with it
+SLICE = 1.0
+
+def is_eye(board, point, color):
+    # single point eye: every neighbour is one of color's stones
+    cells = board.cells
+    return all(cells[n] == color for n in board.neighbours[point])
+
+def playable(board, point, color):
+    '''
+    legal and not one of color's own eyes, in a single pass over the neighbours
+    '''
+    cells = board.cells
+    liberties = board.liberties
+    find = board.find
+    eye = True
+    connects = False
+    for n in board.neighbours[point]:
+        value = cells[n]
+        if value == EMPTY:
+            return True
+        count = len(liberties[find(n)])
+        if value == color:
+            connects = connects or count > 1
+        elif count == 1:
+            # captures
+            return True
+        else:
+            eye = False
+    # surrounded by own stones is an eye, otherwise it must join a chain
+    # with a liberty to spare
+    return connects and not eye
+
+def play(board, point, color):
+    '''
+    plays a legal move, returning the points it captured
+    '''
+    captured = []
+    if point != PASS:
+        roots = board.atari_chains(point, opponent(color))
+        board.place(point, color)
+        for root in roots:
+            captured.extend(board.remove_chain(root))
+    return captured
+
+def candidate_moves(board, color, positions=()):
+    moves = [
+        point for point, is_legal in enumerate(board.legal_moves(color, positions))
+        if is_legal and not is_eye(board, point, color)
+    ]
+    moves.append(PASS)
+    return moves
+
+def playout(board, color, komi, rng, max_moves):
+    '''
+    plays uniformly random moves, never filling a player's own eyes, until
+    both players pass. returns the color with the higher area count
+    '''
+    passes = 0
+    empty = [point for point, value in enumerate(board.cells) if value == EMPTY]
+    for _ in range(max_moves):
+        # draw random empty points, moving rejected ones past `remaining`
+        move = PASS
+        remaining = len(empty)
+        while remaining:
+            idx = rng.randrange(remaining)
+            point = empty[idx]
+            if not playable(board, point, color):
+                remaining -= 1
+                empty[idx], empty[remaining] = empty[remaining], empty[idx]
+                continue
+            move = point
+            empty[idx] = empty[-1]
+            empty.pop()
+            break
+
+        if move == PASS:
+            passes += 1
+            if passes == 2:
+                break
+        else:
+            passes = 0
+            empty.extend(play(board, move, color))
+        color = opponent(color)
+    return winner(board, komi)
+
+def winner(board, komi):
+    # area count where empty points only count as eyes, good enough at the
+    # end of a playout where every remaining empty point is an eye
+    counts = [0, 0, 0]
+    cells = board.cells
+    for point, value in enumerate(cells):
+        if value:
+            counts[value] += 1
+        else:
+            owners = {cells[n] for n in board.neighbours[point]}
+            if len(owners) == 1:
+                counts[owners.pop()] += 1
+    return BLACK if counts[BLACK] > counts[WHITE] + komi else WHITE
+
+class node():
+    def __init__(self, move, color, parent=None):
+        self.move = move
+        # the color that played `move` to reach this node
+        self.color = color
+        self.parent = parent
+        self.children = []
+        self.untried = None
+        self.visits = 0
+        self.wins = 0
+
+    def select(self, exploration):
+        log_visits = math.log(self.visits)
+        return max(
+            self.children,
+            key=lambda child: child.wins / child.visits + exploration * math.sqrt(log_visits / child.visits)
+        )
+
+def search(board, color, positions, komi, budget, seed, exploration=1.4, deadline=None):
+    '''
+    UCT search from `board` with `color` to move for `budget` seconds, and
+    never past the wall clock `deadline` save for a single playout.
+    returns ({move: visits} at the root, playouts run)
+    '''
+    rng = random.Random(seed)
+    root = node(move=None, color=opponent(color))
+    root.untried = candidate_moves(board, color, positions)
+    max_moves = len(board) * 2
+    if deadline is not None:
+        budget = min(budget, deadline - time.time())
+    deadline = time.perf_counter() + budget
+    playouts = 0
+
+    while not playouts or time.perf_counter() < deadline:
+        current = root
+        position = copy(board)
+        to_move = color
+        passes = 0
+
+        # selection
+        while not current.untried and current.children:
+            current = current.select(exploration)
+            play(position, current.move, to_move)
+            passes = passes + 1 if current.move == PASS else 0
+            to_move = opponent(to_move)
+
+        # expansion
+        if current.untried is None:
+            current.untried = candidate_moves(position, to_move) if passes < 2 else []
+        if current.untried:
+            move = current.untried.pop(rng.randrange(len(current.untried)))
+            play(position, move, to_move)
+            passes = passes + 1 if move == PASS else 0
+            child = node(move=move, color=to_move, parent=current)
+            current.children.append(child)
+            current = child
+            to_move = opponent(to_move)
+
+        # simulation
+        result = playout(position, to_move, komi, rng, max_moves) if passes < 2 else winner(position, komi)
+        playouts += 1
+
+        # backpropagation
+        while current is not None:
+            current.visits += 1
+            if current.color == result:
+                current.wins += 1
+            current = current.parent
+
+    return {child.move: child.visits for child in root.children}, playouts
+
+async def choose_move(board, color, positions, komi, budget, workers=None):
+    '''
+    root parallel search: `workers` lanes keep growing fresh trees a slice
+    at a time until `budget` seconds have passed and the visit counts are
+    summed. slices queued behind other work only search the time left, so a
+    busy pool makes the move weaker rather than later
+    '''
+    loop = asyncio.get_running_loop()
+    workers = workers or worker_count()
+    deadline = time.time() + budget
+    visits = Counter()
+
+    async def lane():
+        while True:
+            job = functools.partial(search, board, color, positions, komi, min(SLICE, budget),
+                random.getrandbits(32), deadline=deadline)
+            counts, _ = await loop.run_in_executor(process_pool(), job)
+            visits.update(counts)
+            if deadline - time.time() < SLICE / 10:
+                return
+
+    await asyncio.gather(*(lane() for _ in range(workers)))
+    if not visits:
+        return PASS
+    return visits.most_common(1)[0][0]
@@ -2,25 +2,15 @@ import pathlib
 import asyncio
 
 from .go import Go
-from .logic import ruleset
+from .scenarios import SCENARIOS
 
 from utils import logger
 
 class MockGo(Go):
-    SCENARIOS = {
-        'capture': [
-            (0,3),(0,2),(1,3),(1,2),(2,4),(0,4),(4,3),(1,4),(2,2),(2,3)
-        ],
-        'sacrifice': [
-            (0,0),(0,3),(0,1),(1,2),(0,2),(1,4),(0,3),(2,3),(1,3)
-        ],
-        'occupied': [
-            (5,5),(5,5),(5,3),(3,3),(5,5)
-        ],
-        'nested_capture': [
-            (2,4),(4,5),(6,4),(5,4),(4,2),(4,3),(4,6),(3,4),(3,3),(2,2),(3,5),(2,6),(5,5),(6,6),(5,3),(6,2),(4,4)
-        ]
-    }
+    # scripted games are not journaled or restored
+    NAME = None
+    BOT_ENABLED = False
+    SCENARIOS = SCENARIOS
 
     def __init__(self, session_id, client, db, channel, message, primary, tertiary):
         super().__init__(
@@ -45,19 +35,8 @@ class MockGo(Go):
 
         
     def initialize_helper(self):
-        player_order = [self.primary, self.tertiary]
-        self.current_player = player_order[0]
-        self.team_skin = {
-            player_order[0].id: {
-                'tile': self.BLACK_TILE,
-                'color': self.BLACK_COLOR
-            },
-            player_order[1].id: {
-                'tile': self.WHITE_TILE,
-                'color': self.WHITE_COLOR
-            }
-        }
-        self.board = ruleset.initialize_board(self)
+        # scripted moves alternate from the primary player, who always opens
+        self.assign_colors([self.primary, self.tertiary])
         pathlib.Path(self.emoji_directory).mkdir(parents=True, exist_ok=True)
         pathlib.Path(self.assets_directory).mkdir(parents=True, exist_ok=True)
 
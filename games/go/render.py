@@ -1,109 +1,296 @@
+import os
 import string
-import datetime
+import hashlib
+from io import BytesIO
+from copy import copy
+from functools import lru_cache
 
 import s3
-from utils.image import get_emoji_svg
+from utils.image import get_emoji_sprite
+
+from .logic import ruleset
 
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
 
 BACKGROUND_PATH = "games/go/assets/rasters/kaya.jpg"
 FONT_PATH = "games/go/assets/fonts/Ubuntu_Mono/UbuntuMono-Regular.ttf"
+# twemoji svgs rasterize to 36px at scale 1
+EMOJI_SIZE = 36
+ILLEGAL_COLOR = (128, 128, 128)
+
+IMAGE_FORMATS = {
+    # name: (extension, content type, PIL save arguments). effort settings
+    # are the cheapest that still shrink a 19x19 frame, see benchmarks.encode
+    'jpeg': ('jpg', 'image/jpeg', {'format': 'JPEG', 'quality': 80}),
+    'png': ('png', 'image/png', {'format': 'PNG', 'compress_level': 6}),
+    'webp': ('webp', 'image/webp', {'format': 'WEBP', 'lossless': True, 'method': 0}),
+    'webp-lossy': ('webp', 'image/webp', {'format': 'WEBP', 'quality': 80, 'method': 2}),
+}
+# quantized to a palette before saving
+PALETTE_FORMATS = {'png'}
+# frames are shared between games under content addressed keys. bump the
+# version whenever drawing changes so stale pictures are not reused
+FRAMES_PREFIX = 'go/frames'
+RENDER_VERSION = 1
+# chosen per deployment
+IMAGE_FORMAT = os.getenv('IMAGE_FORMAT', 'jpeg')
+if IMAGE_FORMAT not in IMAGE_FORMATS:
+    raise ValueError(f"IMAGE_FORMAT must be one of {tuple(IMAGE_FORMATS)}")
+
+class FrameState():
+    '''
+    copy of everything a frame is drawn from. taken on the event loop so the
+    render threads never read live game state or touch the database
+    '''
+    def __init__(self, state, emojis, final=False):
+        self.BOARD_X = state.BOARD_X
+        self.BOARD_Y = state.BOARD_Y
+        self.goban = copy(state.goban)
+        self.current_color = state.current_color
+        self.positions = frozenset(state.positions)
+        self.players = dict(state.players)
+        self.primary = state.primary
+        self.tertiary = state.tertiary
+        # the last frame of a game has no illegal move marks, which also keys
+        # it apart from every frame a live game shows
+        self.winner = state.winner or final
+        self.assets_directory = state.assets_directory
+        self.emojis = emojis
+
+    def get_player_emojis(self):
+        return self.emojis
+
+class BoardFrame():
+    '''
+    last frame drawn for one game, so the next render only repaints the
+    cells that changed. renders of a game must not run concurrently
+    '''
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.buffer = None
+        self.key = None
+        self.marks = frozenset()
 
 class GobanRenderer():
-    def __init__(self, state, config={}):
-        self.state = state
+    def __init__(self, state, emojis, frame=None, dirty=(), config={}, format=IMAGE_FORMAT, final=False):
+        self.state = FrameState(state, emojis, final)
+        self.frame = frame
+        self.dirty = frozenset(dirty)
         self.config = config
-        
-    def save(self):
-        with GameStateRenderer(state=self.state, *self.config) as frame:
-            timestamp = datetime.datetime.now().isoformat()
-            full_path = f'{self.state.assets_directory}/{timestamp}.jpg'
-            frame.save(full_path, quality=80)
+        self.format = format
+
+        self.final = bool(self.state.winner)
+        self.key = frame_key(self.state, format, config)
+
+    def encode(self):
+        '''
+        (data, key, content type) of the frame, ready to upload
+        '''
+        with GameStateRenderer(state=self.state, frame=self.frame, dirty=self.dirty, **self.config) as frame:
+            data = encode_frame(frame, format=self.format)
+        _, content_type, _ = IMAGE_FORMATS[self.format]
+        return data, self.key, content_type
 
-        s3.flush_directory(self.state.assets_directory)
-        return s3.upload_file(full_path)
+    def save(self):
+        data, key, content_type = self.encode()
+        return s3.upload_bytes(data, key, content_type=content_type)
+
+def frame_key(state, format, config):
+    '''
+    storage key addressed by everything a frame is drawn from, so the same
+    picture is only ever rendered and uploaded once. the position is its
+    zobrist hash, the rest of the frame widens it to a 128 bit digest
+    '''
+    marks = b'' if state.winner else bytes(ruleset.legal_moves(state))
+    owners = tuple((color, player.id == state.primary.id) for color, player in sorted(state.players.items()))
+    settings = (RENDER_VERSION, state.BOARD_X, state.BOARD_Y, format, repr(sorted(config.items())))
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(state.goban.hash.to_bytes(8, 'little'))
+    digest.update(marks)
+    digest.update(repr((state.get_player_emojis(), owners, settings)).encode())
+    extension, _, _ = IMAGE_FORMATS[format]
+    return f'{FRAMES_PREFIX}/{digest.hexdigest()}.{extension}'
+
+def encode_frame(frame, format='jpeg', quality=None):
+    '''
+    encodes an RGB frame in one of IMAGE_FORMATS. quality overrides the
+    format's default where it has one
+    '''
+    _, _, options = IMAGE_FORMATS[format]
+    if quality is not None and 'quality' in options:
+        options = {**options, 'quality': quality}
+    if format in PALETTE_FORMATS:
+        # boards are a handful of flat colors over the wood, 256 covers them
+        frame = frame.quantize(colors=256, method=Image.FASTOCTREE)
+    with BytesIO() as output:
+        frame.save(output, **options)
+        return output.getvalue()
 
 class GameStateRenderer():
-    def __init__(self, state, x_grid=9, y_grid=9, width=490, height=490, line_width=2,
+    def __init__(self, state, frame=None, dirty=(), x_grid=None, y_grid=None, width=None, height=None, line_width=2,
         legend_margin_x=.92, legend_margin_y=.82, legend_padding={'top': 0,'bottom': 2/3,'left': 1/6,'right': 1/2},
-        font_size=28, typeface=FONT_PATH,
-        tile_scale=1.5):
+        font_size=None, typeface=FONT_PATH,
+        tile_scale=None, min_step_size=36, max_width=490, illegal_scale=.18):
 
         self.state = state
-
-        # grid
-        self.x_grid = x_grid
-        self.y_grid = y_grid
-        self.width = width
-        self.height = height
+        self.frame = frame
+        self.dirty = dirty
+
+        # grid. 9x9 keeps the original 490px board, larger boards grow until
+        # each intersection is at least min_step_size pixels apart
+        self.x_grid = x_grid or state.BOARD_X
+        self.y_grid = y_grid or state.BOARD_Y
+        step_size = max(min_step_size, int(max_width / (max(self.x_grid, self.y_grid) - 1)))
+        self.width = width or step_size * (self.x_grid - 1) + line_width
+        self.height = height or step_size * (self.y_grid - 1) + line_width
         self.line_width = line_width
 
         # legend
         self.legend_margin_x = legend_margin_x
         self.legend_margin_y = legend_margin_y
         self.legend_padding = legend_padding
-        self.font_size = font_size
+        self.font_size = font_size or int(step_size * .46)
         self.typeface = typeface
 
         # emojis
-        self.tile_scale = tile_scale
+        self.tile_scale = tile_scale or step_size * .88 / EMOJI_SIZE
+        self.illegal_scale = illegal_scale
 
     def __enter__(self):
-        with GridRenderer(
+        # only used for its step sizes, the drawn grid lives in the static layer
+        grid = GridRenderer(
             x_grid=self.x_grid,
             y_grid=self.y_grid,
             width=self.width,
             height=self.height,
-            line_width=self.line_width) as grid:
-            # padding
-            out_height = self.height + grid.step_size_y * 2
-            out_width = self.width + grid.step_size_x * 2
-
-            buffer = Image.new(mode='RGBA', size=(out_height, out_width), color=255)
-
-            BackgroundRenderer(
-                buffer=buffer,
-                width=out_width,
-                height=out_height)
-            
-            buffer.paste(grid.buffer, (int((out_width - self.width)/2), int((out_height - self.height)/2)), grid.buffer.convert('RGBA'))
-    
-            LegendRenderer(
-                grid=grid,
-                buffer=buffer,
-                legend_margin_x=self.legend_margin_x,
-                legend_margin_y=self.legend_margin_y,
-                legend_padding=self.legend_padding,
-                font_size=self.font_size,
-                typeface=self.typeface)
-
-            with EmojiTileRenderer(
-                state=self.state,
-                tile_scale=self.tile_scale) as (primary_emoji, secondary_emoji):
-
-                for yi, y in enumerate(self.state.board):
-                    for xi, t in enumerate(y):
-                        if t and t.owner and t.owner.id is self.state.primary.id:
-                            tile = primary_emoji
-                            buffer.paste(
-                                tile,
-                                (int(1 + grid.step_size_y*(yi+1) - tile.width/2), int(1 + grid.step_size_x*(xi+1) - tile.height/2)),
-                                tile.convert('RGBA')
-                            )
-                        elif t and t.owner and t.owner.id is self.state.tertiary.id:
-                            tile = secondary_emoji
-                            buffer.paste(
-                                tile,
-                                (int(1 + grid.step_size_y*(yi+1) - tile.width/2),int(1 + grid.step_size_x*(xi+1) - tile.height/2)),
-                                tile.convert('RGBA')
-                            )
-
-            buffer = buffer.convert('RGB')
-            self.buffer = buffer
+            line_width=self.line_width)
+
+        settings = (
+            self.x_grid, self.y_grid, self.width, self.height, self.line_width,
+            self.legend_margin_x, self.legend_margin_y, tuple(self.legend_padding.items()),
+            self.font_size, self.typeface)
+        layer = static_layer(*settings)
+
+        board = self.state.goban
+        marks = frozenset() if self.state.winner else frozenset(
+            point for point, is_legal in enumerate(ruleset.legal_moves(self.state))
+            if not is_legal and not board[point])
+
+        with EmojiTileRenderer(
+            state=self.state,
+            tile_scale=self.tile_scale) as (primary_emoji, secondary_emoji):
+
+            # map stone colors to the owning player's emoji
+            emojis = {
+                color: primary_emoji if player.id == self.state.primary.id else secondary_emoji
+                for color, player in self.state.players.items()
+            }
+
+            # anything that changes every cell forces a full redraw
+            key = (settings, self.tile_scale, self.state.get_player_emojis(),
+                tuple((color, player.id) for color, player in self.state.players.items()))
+            frame = self.frame
+            if frame is None or frame.buffer is None or frame.key != key:
+                buffer = layer.copy()
+                points = [point for point, color in enumerate(board.cells) if color]
+                redraw_marks = marks
+            else:
+                buffer = frame.buffer
+                points = self.dirty | (marks ^ frame.marks)
+                redraw_marks = points & marks
+                for point in points:
+                    # the cell's box never reaches a neighbouring stone
+                    box = self.cell_box(grid, board, point)
+                    buffer.paste(layer.crop(box), box[:2])
+
+            for point in points:
+                color = board[point]
+                if color:
+                    tile = emojis[color]
+                    x, y = self.cell_center(grid, board, point)
+                    buffer.paste(
+                        tile,
+                        (int(x - tile.width/2), int(y - tile.height/2)),
+                        tile
+                    )
+
+        IllegalMoveRenderer(
+            grid=grid,
+            buffer=buffer,
+            board=board,
+            points=redraw_marks,
+            scale=self.illegal_scale)
+
+        if frame is not None:
+            frame.buffer = buffer
+            frame.key = key
+            frame.marks = marks
+        self.buffer = buffer
         return self.buffer
 
     def __exit__(self, type, value, tb):
-        self.buffer.close()
+        # the game's frame buffer outlives the render
+        if self.frame is None:
+            self.buffer.close()
+
+    @staticmethod
+    def cell_center(grid, board, point):
+        yi, xi = board.coords(point)
+        return 1 + grid.step_size_y*(yi+1), 1 + grid.step_size_x*(xi+1)
+
+    @staticmethod
+    def cell_box(grid, board, point):
+        x, y = GameStateRenderer.cell_center(grid, board, point)
+        half_x = grid.step_size_y // 2
+        half_y = grid.step_size_x // 2
+        return (x - half_x, y - half_y, x + half_x, y + half_y)
+
+@lru_cache(maxsize=None)
+def static_layer(x_grid, y_grid, width, height, line_width,
+    legend_margin_x, legend_margin_y, legend_padding, font_size, typeface):
+    '''
+    background, grid and legend for one board size and set of dimensions.
+    built once per process, callers must paste onto a copy
+    '''
+    with GridRenderer(
+        x_grid=x_grid,
+        y_grid=y_grid,
+        width=width,
+        height=height,
+        line_width=line_width) as grid:
+        # padding
+        out_height = height + grid.step_size_y * 2
+        out_width = width + grid.step_size_x * 2
+
+        buffer = Image.new(mode='RGBA', size=(out_height, out_width), color=255)
+
+        BackgroundRenderer(
+            buffer=buffer,
+            width=out_width,
+            height=out_height)
+
+        buffer.paste(grid.buffer, (int((out_width - width)/2), int((out_height - height)/2)), grid.buffer.convert('RGBA'))
+
+        LegendRenderer(
+            grid=grid,
+            buffer=buffer,
+            legend_margin_x=legend_margin_x,
+            legend_margin_y=legend_margin_y,
+            legend_padding=dict(legend_padding),
+            font_size=font_size,
+            typeface=typeface)
+    return buffer.convert('RGB')
+
+@lru_cache(maxsize=None)
+def load_background(width, height):
+    with Image.open(BACKGROUND_PATH, 'r') as background:
+        return background.resize((width, height), Image.ANTIALIAS)
+
+@lru_cache(maxsize=None)
+def load_font(typeface, font_size):
+    return ImageFont.truetype(typeface, font_size)
 
 class EmojiTileRenderer():
     def __init__(self, state, tile_scale):
@@ -112,22 +299,28 @@ class EmojiTileRenderer():
 
     def __enter__(self):
         primary_tile, tertiary_tile = self.state.get_player_emojis()
-        primary_emoji_buffer = get_emoji_svg(primary_tile, scale=self.tile_scale)
-        tertiary_emoji_buffer = get_emoji_svg(tertiary_tile, scale=self.tile_scale)
-        self.primary_emoji = Image.open(primary_emoji_buffer)
-        self.tertiary_emoji = Image.open(tertiary_emoji_buffer)
+        # sprites are shared through the cache, so they are not closed on exit
+        self.primary_emoji = get_emoji_sprite(primary_tile, scale=self.tile_scale)
+        self.tertiary_emoji = get_emoji_sprite(tertiary_tile, scale=self.tile_scale)
         return self.primary_emoji, self.tertiary_emoji
-    
+
     def __exit__(self, type, value, tb):
-        self.primary_emoji.close()
-        self.tertiary_emoji.close()
+        pass
+
+class IllegalMoveRenderer():
+    def __init__(self, grid, buffer, board, points, scale):
+        # gray out empty points the current player may not play (suicide, ko)
+        draw = ImageDraw.Draw(buffer)
+        radius_x = grid.step_size_x * scale
+        radius_y = grid.step_size_y * scale
+        for point in points:
+            x, y = GameStateRenderer.cell_center(grid, board, point)
+            draw.ellipse((x - radius_x, y - radius_y, x + radius_x, y + radius_y), fill=ILLEGAL_COLOR)
+        del draw
 
 class BackgroundRenderer():
     def __init__(self, buffer, width, height):
-        background = Image.open(BACKGROUND_PATH, 'r')
-        background = background.resize((width, height), Image.ANTIALIAS)
-        buffer.paste(background, (0,0))
-        background.close()
+        buffer.paste(load_background(width, height), (0,0))
 
 class GridRenderer():
     def __init__(self, x_grid, y_grid, width, height, line_width):
@@ -188,7 +381,7 @@ class LegendRenderer():
         position = Position(buffer, grid.step_size_x, grid.step_size_y, legend_padding)
 
         draw = ImageDraw.Draw(buffer)
-        fnt = ImageFont.truetype(typeface, font_size)
+        fnt = load_font(typeface, font_size)
 
         # top
         for xi, x in enumerate(range(margin_x, width, grid.step_size_x)):
@@ -0,0 +1,91 @@
+'''
+rebuilds a game's frames from its move log, so nothing is kept on disk
+while the game is played
+'''
+import math
+import asyncio
+from collections import namedtuple
+
+from .board import BLACK, WHITE, opponent
+from .logic import ruleset
+from .render import GameStateRenderer, BoardFrame, encode_frame
+
+from utils.image import export_replay
+from utils.executor import run_in_process, run_in_render_pool, worker_count
+
+# frames per job never drop below this, replaying the moves before a chunk
+# is cheap but each job pays for loading sprites and the static layer
+MIN_CHUNK = 16
+
+# stands in for a discord member, the renderer only reads ids
+participant = namedtuple('participant', 'id')
+
+class replayState():
+    '''
+    the attributes ruleset and GameStateRenderer read, rebuilt move by move.
+    emojis are ordered (primary's, tertiary's) like Go.get_player_emojis,
+    and the primary player may hold either color
+    '''
+    def __init__(self, board_size, players, primary, emojis):
+        self.BOARD_X = board_size
+        self.BOARD_Y = board_size
+        self.players = {color: participant(id) for color, id in players.items()}
+        self.primary = participant(primary)
+        self.tertiary = participant(players[BLACK] if players[WHITE] == primary else players[WHITE])
+        self.emojis = emojis
+        self.winner = None
+        self.current_color = BLACK
+        self.row_selection = None
+        self.col_selection = None
+        self.goban = ruleset.initialize_board(self)
+        self.positions = {self.goban.hash}
+        self.changes = []
+
+    def get_player_emojis(self):
+        return self.emojis
+
+    def apply(self, move):
+        color, row, col = move
+        self.current_color = color
+        self.changes = []
+        if row is not None:
+            self.row_selection, self.col_selection = row, col
+            if not ruleset.attempt_placement(self):
+                raise ValueError(f'illegal move in log: {move}')
+        self.current_color = opponent(color)
+
+def render_chunk(board_size, moves, start, stop, players, primary, emojis, finished, quality, config):
+    '''
+    encoded frames start..stop, where frame i shows the board after i moves.
+    runs in a worker process
+    '''
+    state = replayState(board_size, players, primary, emojis)
+    for move in moves[:start]:
+        state.apply(move)
+
+    frame = BoardFrame()
+    frames = []
+    for index in range(start, stop):
+        if index > start:
+            state.apply(moves[index - 1])
+        # the last frame of a finished game has no illegal move marks
+        state.winner = finished and index == len(moves)
+        with GameStateRenderer(state=state, frame=frame, dirty=frozenset(state.changes), **config) as buffer:
+            frames.append(encode_frame(buffer, format='jpeg', quality=quality))
+    return frames
+
+async def build_replay(output_path, board_size, moves, players, primary, emojis, finished=False,
+    quality=80, config={}, hold_seconds=1):
+    '''
+    renders every frame of the move log in parallel chunks across the
+    process pool, then encodes them in order into a video at output_path
+    '''
+    count = len(moves) + 1
+    size = max(MIN_CHUNK, math.ceil(count / worker_count()))
+    chunks = await asyncio.gather(*(
+        run_in_process(render_chunk, board_size, moves, start, min(start + size, count),
+            players, primary, emojis, finished, quality, config)
+        for start in range(0, count, size)
+    ))
+    frames = (frame for chunk in chunks for frame in chunk)
+    return await run_in_render_pool(export_replay, frames, output_path, hold_seconds)
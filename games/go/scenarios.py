@@ -0,0 +1,15 @@
+# scripted move lists replayed by >mock and the headless simulator
+SCENARIOS = {
+    'capture': [
+        (0,3),(0,2),(1,3),(1,2),(2,4),(0,4),(4,3),(1,4),(2,2),(2,3)
+    ],
+    'sacrifice': [
+        (0,0),(0,3),(0,1),(1,2),(0,2),(1,4),(0,3),(2,3),(1,3)
+    ],
+    'occupied': [
+        (5,5),(5,5),(5,3),(3,3),(5,5)
+    ],
+    'nested_capture': [
+        (2,4),(4,5),(6,4),(5,4),(4,2),(4,3),(4,6),(3,4),(3,3),(2,2),(3,5),(2,6),(5,5),(6,6),(5,3),(6,2),(4,4)
+    ]
+}
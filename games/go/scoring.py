@@ -0,0 +1,68 @@
+import numpy as np
+from scipy import ndimage
+
+from .board import EMPTY, BLACK, WHITE
+
+AREA = 'area'
+TERRITORY = 'territory'
+SCORING_METHODS = (AREA, TERRITORY)
+
+def bordering(mask):
+    '''
+    points orthogonally next to any point of mask
+    '''
+    border = np.zeros_like(mask)
+    border[1:, :] |= mask[:-1, :]
+    border[:-1, :] |= mask[1:, :]
+    border[:, 1:] |= mask[:, :-1]
+    border[:, :-1] |= mask[:, 1:]
+    return border
+
+def territory(cells):
+    '''
+    labels the empty regions of a (size, size) cell array and returns the
+    masks of the points owned outright by black and by white
+    '''
+    empty = cells == EMPTY
+    labels, regions = ndimage.label(empty)
+
+    # a region belongs to a color if it touches that color's stones only
+    touches_black = np.zeros(regions + 1, dtype=bool)
+    touches_white = np.zeros(regions + 1, dtype=bool)
+    touches_black[labels[bordering(cells == BLACK) & empty]] = True
+    touches_white[labels[bordering(cells == WHITE) & empty]] = True
+    touches_black[0] = touches_white[0] = False
+
+    black = (touches_black & ~touches_white)[labels]
+    white = (touches_white & ~touches_black)[labels]
+    return black, white
+
+def score(board, komi=6.5, dead=(), method=AREA):
+    '''
+    returns the (black, white) score of a goban. stones in `dead` are taken
+    off the board and counted as prisoners before territory is labelled
+    '''
+    cells = np.frombuffer(board.cells, dtype=np.uint8).reshape(board.size, board.size)
+    prisoners = list(board.prisoners)
+
+    dead = [point for point in dead if board.cells[point] != EMPTY]
+    if dead:
+        cells = cells.copy()
+        flat = cells.reshape(-1)
+        points = np.fromiter(dead, dtype=np.intp, count=len(dead))
+        prisoners[BLACK] += int(np.count_nonzero(flat[points] == BLACK))
+        prisoners[WHITE] += int(np.count_nonzero(flat[points] == WHITE))
+        flat[points] = EMPTY
+
+    black_territory, white_territory = territory(cells)
+    black = int(np.count_nonzero(black_territory))
+    white = int(np.count_nonzero(white_territory)) + komi
+
+    if method == AREA:
+        black += int(np.count_nonzero(cells == BLACK))
+        white += int(np.count_nonzero(cells == WHITE))
+    else:
+        # captured and dead stones of the other color count for each side
+        black += prisoners[WHITE]
+        white += prisoners[BLACK]
+    return black, white
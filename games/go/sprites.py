@@ -0,0 +1,43 @@
+'''
+warms the emoji sprite cache ahead of time: rasterizes the default tiles,
+every emoji players have picked and any given on the command line at the
+scale each board size renders at. reads EMOJI_SVG_DIRECTORY when it is set,
+so a deploy can fill the cache from the local bundle before going offline
+
+    python -m games.go.sprites [--no-players] [emoji ...]
+'''
+import asyncio
+import argparse
+from types import SimpleNamespace
+
+from .go import Go
+from .render import GameStateRenderer
+
+from utils.image import emoji_cache
+
+def tile_scales(sizes=Go.BOARD_SIZES, configs=({}, Go.REPLAY_CONFIG)):
+    # live boards and replay frames may be drawn at different widths
+    return sorted({
+        GameStateRenderer(SimpleNamespace(BOARD_X=size, BOARD_Y=size), **config).tile_scale
+        for size in sizes for config in configs
+    })
+
+async def player_emojis():
+    from database import PlayersTable
+    return await PlayersTable().get_emojis()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('emojis', nargs='*')
+    parser.add_argument('--no-players', action='store_true', help="skip the emojis stored in the players table")
+    args = parser.parse_args()
+
+    emojis = {Go.BLACK_TILE, Go.WHITE_TILE, *args.emojis}
+    if not args.no_players:
+        emojis.update(asyncio.run(player_emojis()))
+    scales = tile_scales()
+    emoji_cache().preload(sorted(emojis), scales)
+    print(f"cached {len(emojis)} emojis at {len(scales)} scales")
+
+if __name__ == '__main__':
+    main()
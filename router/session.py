@@ -1,21 +1,34 @@
+import json
+import asyncio
 from collections import defaultdict
 
 from faker import Faker
 
+from utils import logger
+from database.matches import WIN, RESIGN, DRAW
+
+# journaled games rebuilt at once on startup, bounded for the discord api
+RESTORE_CONCURRENCY = 16
+
 class SessionManager():
-    def __init__(self, client, db):
+    def __init__(self, client, db, journal=None, matches=None):
         self.client = client
         self.db = db
+        self.journal = journal
+        self.matches = matches
+        self.restored = False
         self._sessions = {}
         self._messages = {}
         self._players = defaultdict(set)
+        # background tasks, the loop only keeps weak references to them
+        self._tasks = set()
 
-    async def add_session(self, channel, primary, tertiary, application, verbose=False):
+    async def add_session(self, channel, primary, tertiary, application, verbose=False, options=None):
         session_id = SessionManager.generate_session_id(primary, tertiary)
         if not self.get_session(session_id):
-            self.db.insert_bulk([primary.id, tertiary.id])
+            await self.db.insert_bulk([primary.id, tertiary.id])
             message = await channel.send(f"{primary.display_name} booting session between {primary.display_name} and {tertiary.display_name}...")
-            new_session = application(session_id=session_id, client=self.client, db=self.db, channel=channel, message=message, primary=primary, tertiary=tertiary)
+            new_session = application(session_id=session_id, client=self.client, db=self.db, channel=channel, message=message, primary=primary, tertiary=tertiary, **(options or {}))
 
             sub_message = None
             if hasattr(new_session, 'SUB_MESSAGE'):
@@ -24,30 +37,165 @@ class SessionManager():
 
             await new_session.render_message()
 
-            self._sessions[session_id] = new_session
-            self._players[primary.id].add(session_id)
-            self._players[tertiary.id].add(session_id)
-            self._messages[message.id] = session_id
-            if sub_message:
-                self._messages[sub_message.id] = session_id
+            self.register(new_session, sub_message)
+            if self.journal and getattr(new_session, 'NAME', None):
+                new_session.journal = self.journal
+                await self.journal.start_game(
+                    game_id=new_session.id,
+                    application=new_session.NAME,
+                    channel_id=channel.id,
+                    message_id=message.id,
+                    sub_message_id=sub_message.id if sub_message else None,
+                    primary_id=primary.id,
+                    tertiary_id=tertiary.id,
+                    first_id=new_session.first_player.id,
+                    options=json.dumps(new_session.options))
             return new_session
         await channel.send(f"there is already a session between {primary.display_name} and {tertiary.display_name}")
         return False
 
     async def remove_session(self, channel, primary, tertiary):
         session_id = SessionManager.generate_session_id(primary, tertiary)
-        if self.get_session(session_id):
-            await channel.send(f"{primary.display_name} ended session between {primary.display_name} and {tertiary.display_name}")
-            await self._sessions[session_id].on_complete()
-            del self._sessions[session_id]
-            self._players[primary.id].remove(session_id)
-            # congrats you played yourself
-            if primary.id != tertiary.id:
-                self._players[tertiary.id].remove(session_id)
+        # unregistered before the first await, so a second >resign sent while
+        # this one finishes finds no session instead of ending it again
+        session = self.unregister(session_id)
+        if session:
+            try:
+                await channel.send(f"{primary.display_name} ended session between {primary.display_name} and {tertiary.display_name}")
+                await session.on_complete()
+            finally:
+                # a failed replay must not leave the game live in the journal
+                # or lose its result. on_complete has marked it ended by now,
+                # so nothing is journaled after the delete
+                if session.journal:
+                    await self.journal.end_game(session.id)
+                await self.record_result(session, resigned_by=primary)
             return True
         await channel.send(f"no active session found between {primary.display_name} and {tertiary.display_name}")
         return False
 
+    async def record_result(self, session, resigned_by):
+        # scripted games and games against yourself do not count
+        if not self.matches or not getattr(session, 'NAME', None) or session.primary.id == session.tertiary.id:
+            return
+        winner = session.winner
+        if winner:
+            result = WIN
+        elif session.is_draw():
+            result = DRAW
+        else:
+            # ending an unfinished game is a resignation by whoever ended it
+            result = RESIGN
+            winner = session.tertiary if resigned_by.id == session.primary.id else session.primary
+        loser = None if result == DRAW else session.tertiary if winner.id == session.primary.id else session.primary
+        await self.matches.record_match(
+            game_id=session.id,
+            application=session.NAME,
+            primary_id=session.primary.id,
+            tertiary_id=session.tertiary.id,
+            winner_id=winner and winner.id,
+            loser_id=loser and loser.id,
+            result=result,
+            moves=session.move_count)
+
+    def register(self, session, sub_message=None):
+        self._sessions[session.session_id] = session
+        self._players[session.primary.id].add(session.session_id)
+        self._players[session.tertiary.id].add(session.session_id)
+        self._messages[session.message.id] = session.session_id
+        if sub_message:
+            self._messages[sub_message.id] = session.session_id
+
+    def unregister(self, session_id):
+        '''
+        drops a session from every index, returns it or None if it was not live
+        '''
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return None
+        # congrats you played yourself, both ids are the same set
+        self._players[session.primary.id].discard(session_id)
+        self._players[session.tertiary.id].discard(session_id)
+        for message_id in [message_id for message_id, live_id in self._messages.items() if live_id == session_id]:
+            del self._messages[message_id]
+        return session
+
+    async def restore_sessions(self, applications):
+        '''
+        rebuilds every live game in the journal by replaying its moves and
+        re-attaching to its messages. runs once, returns the sessions restored
+        '''
+        if self.restored or not self.journal:
+            return 0
+        self.restored = True
+        slots = asyncio.Semaphore(RESTORE_CONCURRENCY)
+        # players in many games are fetched once for the whole restore
+        members = {}
+
+        async def restore(game, moves):
+            async with slots:
+                try:
+                    return await self.restore_session(applications, game, moves, members)
+                except Exception as e:
+                    # the channel, message or a player is gone, the game cannot continue
+                    logger.info(f"Could not restore game {game[0]}: {e}")
+                    await self.journal.end_game(game[0])
+                    return False
+
+        results = await asyncio.gather(*(restore(game, moves) for game, moves in await self.journal.live_games()))
+        return sum(1 for result in results if result)
+
+    async def restore_session(self, applications, game, moves, members=None):
+        game_id, application, channel_id, message_id, sub_message_id, primary_id, tertiary_id, first_id, options = game
+        channel = self.client.get_channel(channel_id) or await self.client.fetch_channel(channel_id)
+        members = {} if members is None else members
+        primary = await self.cached_member(members, channel, primary_id)
+        tertiary = await self.cached_member(members, channel, tertiary_id)
+        session_id = SessionManager.generate_session_id(primary, tertiary)
+        if self.get_session(session_id):
+            raise ValueError(f"a session between {primary_id} and {tertiary_id} is already live")
+
+        # partial messages edit and react without fetching the message first
+        message = channel.get_partial_message(message_id)
+        sub_message = channel.get_partial_message(sub_message_id) if sub_message_id else None
+        session = applications[application](session_id=session_id, client=self.client, db=self.db, channel=channel,
+            message=message, primary=primary, tertiary=tertiary, journal=self.journal, **json.loads(options))
+        session.id = game_id
+        await session.restore(first_id, moves, sub_message)
+        self.register(session, sub_message)
+        if session.is_bot_turn():
+            self.spawn(session.play_bot_move())
+        return session
+
+    def spawn(self, coroutine):
+        '''
+        runs coroutine in the background, holding on to it until it is done
+        '''
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self.task_done)
+        return task
+
+    def task_done(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error("Background task failed", exc_info=task.exception())
+
+    def cached_member(self, members, channel, member_id):
+        # concurrent restores share one fetch per member
+        key = (getattr(getattr(channel, 'guild', None), 'id', None), member_id)
+        if key not in members:
+            members[key] = asyncio.ensure_future(self.fetch_member(channel, member_id))
+        return members[key]
+
+    async def fetch_member(self, channel, member_id):
+        if member_id == self.client.user.id:
+            return self.client.user
+        guild = getattr(channel, 'guild', None)
+        if guild is None:
+            return self.client.get_user(member_id) or await self.client.fetch_user(member_id)
+        return guild.get_member(member_id) or await guild.fetch_member(member_id)
+
     def get_session(self, session_id):
         return self._sessions[session_id] if session_id in self._sessions else None
 
@@ -58,6 +206,10 @@ class SessionManager():
     def get_session_by_player(self, player_id):
         return [self._sessions[session_id] for session_id in self._players[player_id] if session_id in self._sessions] if player_id in self._players else None
 
+    def get_session_by_channel(self, player_id, channel_id):
+        sessions = self.get_session_by_player(player_id) or []
+        return next((session for session in sessions if session.channel.id == channel_id), None)
+
     @staticmethod
     def generate_session_id(primary, tertiary):
         uuid = Faker()
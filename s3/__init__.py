@@ -1 +1,3 @@
-from .s3 import upload_file, flush_directory
\ No newline at end of file
+from .s3 import upload_bytes
+from .uploads import upload, discard, lookup, retain, release
+from .backends import storage
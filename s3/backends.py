@@ -0,0 +1,106 @@
+import os
+import pathlib
+import threading
+
+import boto3
+from botocore.config import Config
+
+AWS_REGION = os.getenv('AWS_DEFAULT_REGION')
+S3_BUCKET = os.getenv('S3_BUCKET')
+S3_BUCKET_URL = f'https://s3-{AWS_REGION}.amazonaws.com/{S3_BUCKET}'
+
+# 's3' in production, 'local' to run or load test the bot without aws
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 's3')
+STORAGE_DIRECTORY = os.getenv('STORAGE_DIRECTORY', 'storage')
+STORAGE_URL = os.getenv('STORAGE_URL')
+# parallel requests the client keeps connections open for
+STORAGE_CONNECTIONS = int(os.getenv('STORAGE_CONNECTIONS', 16))
+
+# s3 takes at most this many keys per delete request
+DELETE_BATCH = 1000
+
+class S3Backend():
+    '''
+    public-read objects in S3_BUCKET through one long lived client. boto3
+    clients are thread safe once created, only creating one is not
+    '''
+    def __init__(self, bucket=S3_BUCKET, url=S3_BUCKET_URL, connections=STORAGE_CONNECTIONS):
+        self.bucket = bucket
+        self.url = url
+        self.connections = connections
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = boto3.session.Session().client(
+                    's3', config=Config(max_pool_connections=self.connections))
+            return self._client
+
+    def put(self, key, data, content_type):
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body=data,
+            ACL='public-read',
+            ContentType=content_type
+        )
+        return f'{self.url}/{key}'
+
+    def delete(self, keys):
+        keys = list(keys)
+        for start in range(0, len(keys), DELETE_BATCH):
+            self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={
+                    'Objects': [{'Key': key} for key in keys[start:start + DELETE_BATCH]],
+                    'Quiet': True
+                }
+            )
+
+class LocalBackend():
+    '''
+    objects as files under `directory`, served from `url` when one is set
+    '''
+    def __init__(self, directory=STORAGE_DIRECTORY, url=STORAGE_URL):
+        self.directory = pathlib.Path(directory).resolve()
+        self.url = url or self.directory.as_uri()
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def path(self, key):
+        return self.directory / key.lstrip('/')
+
+    def put(self, key, data, content_type):
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write then rename so readers never see half a file
+        temp = path.with_name(f'.{path.name}.{threading.get_ident()}.tmp')
+        temp.write_bytes(data)
+        temp.replace(path)
+        return f'{self.url}/{key.lstrip("/")}'
+
+    def delete(self, keys):
+        for key in keys:
+            self.path(key).unlink(missing_ok=True)
+
+BACKENDS = {
+    's3': S3Backend,
+    'local': LocalBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def storage():
+    '''
+    the STORAGE_BACKEND instance shared by the whole process
+    '''
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if STORAGE_BACKEND not in BACKENDS:
+                raise ValueError(f"STORAGE_BACKEND must be one of {tuple(BACKENDS)}")
+            _backend = BACKENDS[STORAGE_BACKEND]()
+        return _backend
@@ -0,0 +1,166 @@
+import os
+import asyncio
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from .s3 import STORAGE_ERRORS
+from .backends import storage
+
+UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', 8))
+UPLOAD_RETRIES = 3
+# seconds before the first retry, doubled for every retry after it
+RETRY_DELAY = .25
+# seconds between batched deletes of stale objects
+CLEANUP_INTERVAL = 30
+
+class UploadQueue():
+    '''
+    uploads from the event loop through a fixed set of workers, retrying
+    failed puts with backoff. stale keys are collected and deleted in
+    batches in the background instead of listing a prefix before every put.
+
+    uploaded keys are indexed with their url and a count of the messages
+    showing them, so content addressed objects are stored once and only
+    deleted when nothing shows them anymore. a key is never put and deleted
+    at the same time, puts of a key being deleted wait for the delete and
+    keys with a put in flight are left out of the delete
+    '''
+    def __init__(self, workers=UPLOAD_WORKERS, retries=UPLOAD_RETRIES, delay=RETRY_DELAY, interval=CLEANUP_INTERVAL):
+        self.workers = workers
+        self.retries = retries
+        self.delay = delay
+        self.interval = interval
+        self.stale = set()
+        self.urls = {}
+        self.refs = Counter()
+        # puts queued or running, per key
+        self.uploading = Counter()
+        # keys in the running delete batch, set once it is done
+        self.deleting = set()
+        self.deleted = None
+        self.queue = None
+        self.tasks = []
+        self.executor = None
+
+    def start(self):
+        # tasks and the queue belong to the running loop, made on first use
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='upload')
+            self.tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+            self.tasks.append(asyncio.create_task(self.cleanup()))
+
+    async def upload(self, data, key, content_type):
+        '''
+        url of the stored object, or False once every attempt failed
+        '''
+        self.start()
+        # uploaded again before the cleanup got to it
+        self.stale.discard(key)
+        self.uploading[key] += 1
+        try:
+            # a put landing before the delete would be deleted with it
+            while key in self.deleting:
+                await self.deleted.wait()
+            future = asyncio.get_running_loop().create_future()
+            await self.queue.put((data, key, content_type, future))
+            return await future
+        finally:
+            self.uploading[key] -= 1
+            if self.uploading[key] <= 0:
+                del self.uploading[key]
+
+    def discard(self, key):
+        self.urls.pop(key, None)
+        self.stale.add(key)
+
+    def lookup(self, key):
+        return self.urls.get(key)
+
+    def retain(self, key):
+        self.refs[key] += 1
+
+    def release(self, key, delete=True):
+        self.refs[key] -= 1
+        if self.refs[key] <= 0:
+            del self.refs[key]
+            if delete:
+                self.discard(key)
+            else:
+                self.urls.pop(key, None)
+
+    async def worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            data, key, content_type, future = await self.queue.get()
+            try:
+                url = await self.put(loop, data, key, content_type)
+            except Exception as e:
+                not future.done() and future.set_exception(e)
+            else:
+                if url:
+                    self.urls[key] = url
+                not future.done() and future.set_result(url)
+            finally:
+                self.queue.task_done()
+
+    async def put(self, loop, data, key, content_type):
+        for attempt in range(self.retries + 1):
+            try:
+                return await loop.run_in_executor(self.executor, storage().put, key, data, content_type)
+            except STORAGE_ERRORS as e:
+                if attempt == self.retries:
+                    logging.error(e)
+                    return False
+                await asyncio.sleep(self.delay * 2 ** attempt)
+
+    async def cleanup(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.interval)
+            # keys shown or uploaded again since they were discarded stay
+            keys = [key for key in self.stale if key not in self.urls and key not in self.uploading]
+            self.stale = set()
+            if not keys:
+                continue
+            self.deleting = set(keys)
+            self.deleted = asyncio.Event()
+            try:
+                await loop.run_in_executor(self.executor, storage().delete, keys)
+            except STORAGE_ERRORS as e:
+                logging.error(e)
+                # try again with the next batch, puts waited so none is back
+                self.stale.update(keys)
+            finally:
+                self.deleting = set()
+                self.deleted.set()
+
+_uploads = UploadQueue()
+
+async def upload(data, key, content_type='image/jpeg'):
+    return await _uploads.upload(data, key, content_type)
+
+def discard(key):
+    '''
+    marks an uploaded object as no longer shown anywhere
+    '''
+    _uploads.discard(key)
+
+def lookup(key):
+    '''
+    url of an object already uploaded under key, or None
+    '''
+    return _uploads.lookup(key)
+
+def retain(key):
+    _uploads.retain(key)
+
+def release(key, delete=True):
+    '''
+    drops one reference to key. once none are left it is discarded, or with
+    delete=False only forgotten so a finished game keeps its last picture.
+    only pass delete=False for final frames, a key live games share is
+    deleted by whichever game releases it last
+    '''
+    _uploads.release(key, delete)
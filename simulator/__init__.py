@@ -0,0 +1 @@
+from .headless import HeadlessGo, HeadlessConnect4, replay, random_go_game, random_connect4_game
@@ -0,0 +1,104 @@
+'''
+discord-free stand-ins for Go and Connect4 that drive the same rules
+engines, for replaying move lists in scripts and benchmarks
+'''
+import random
+
+from games.go.board import BLACK, EMPTY, opponent
+from games.go.logic import ruleset
+from games.connect4.logic import bitboard, PRIMARY, TERTIARY
+
+class HeadlessGo():
+    '''
+    the attributes of Go that ruleset reads and writes, without players,
+    messages or rendering
+    '''
+    def __init__(self, board_size=9):
+        self.BOARD_X = board_size
+        self.BOARD_Y = board_size
+        self.current_color = BLACK
+        self.row_selection = None
+        self.col_selection = None
+        self.last_state = None
+        self.passes = 0
+        self.komi = 6.5
+        self.scoring = 'area'
+        self.dead_stones = set()
+        self.goban = ruleset.initialize_board(self)
+        self.positions = {self.goban.hash}
+
+    def play(self, row, col):
+        self.row_selection, self.col_selection = row, col
+        is_valid_placement = ruleset.attempt_placement(self)
+        if is_valid_placement:
+            self.last_state = (self.current_color, row, col)
+            self.passes = 0
+            self.current_color = opponent(self.current_color)
+        self.row_selection = None
+        self.col_selection = None
+        return is_valid_placement
+
+    def pass_move(self):
+        self.passes += 1
+        self.last_state = (self.current_color, None, None)
+        self.current_color = opponent(self.current_color)
+        return ruleset.end_game(self)
+
+class HeadlessConnect4():
+    BOARD_X = 7
+    BOARD_Y = 6
+
+    def __init__(self):
+        self.board = bitboard()
+        self.current_slot = PRIMARY
+        self.winner = None
+
+    def detect_current_player_win(self):
+        return self.board.is_win(self.current_slot)
+
+    def play(self, col):
+        if self.winner is not None or not self.board.can_play(col):
+            return False
+        self.board.play(col, self.current_slot)
+        if self.detect_current_player_win():
+            self.winner = self.current_slot
+        else:
+            self.current_slot = TERTIARY if self.current_slot == PRIMARY else PRIMARY
+        return True
+
+def replay(game, moves):
+    '''
+    plays every move in order and returns whether each one was accepted.
+    go moves are (row, col) tuples, connect4 moves are columns
+    '''
+    return [game.play(*move) if isinstance(move, tuple) else game.play(move) for move in moves]
+
+def random_go_game(board_size=9, max_moves=None, seed=None):
+    '''
+    move list of a random game where every move is legal when it is played
+    '''
+    rng = random.Random(seed)
+    game = HeadlessGo(board_size)
+    moves = []
+    for _ in range(max_moves or board_size * board_size * 2):
+        empty = [point for point, color in enumerate(game.goban.cells) if color == EMPTY]
+        rng.shuffle(empty)
+        for point in empty:
+            if game.goban.is_legal(point, game.current_color, game.positions):
+                row, col = game.goban.coords(point)
+                game.play(row, col)
+                moves.append((row, col))
+                break
+        else:
+            break
+    return moves
+
+def random_connect4_game(seed=None):
+    rng = random.Random(seed)
+    game = HeadlessConnect4()
+    moves = []
+    while game.winner is None and not game.board.is_full():
+        col = rng.choice(game.board.playable_columns())
+        game.play(col)
+        moves.append(col)
+    return moves
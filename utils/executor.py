@@ -0,0 +1,62 @@
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# workers start from a fresh interpreter. a forked worker would copy the
+# render, upload and database threads' locks in whatever state they were in
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+# modules pool jobs run from, imported once by the fork server instead of
+# once per worker. the default would import __main__, the bot itself
+PRELOAD = ['games.go.mcts', 'games.go.replay', 'games.connect4.solver']
+
+_process_pool = None
+
+def worker_count():
+    return os.cpu_count() or 1
+
+def process_pool():
+    '''
+    process pool shared by every cpu bound job (bots, replays). created on
+    first use so importing this module never forks
+    '''
+    global _process_pool
+    if _process_pool is None:
+        context = multiprocessing.get_context(START_METHOD)
+        if START_METHOD == 'forkserver':
+            context.set_forkserver_preload(PRELOAD)
+        _process_pool = ProcessPoolExecutor(max_workers=worker_count(), mp_context=context)
+    return _process_pool
+
+async def run_in_process(fn, *args):
+    '''
+    runs fn(*args) in the process pool without blocking the event loop
+    '''
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(process_pool(), fn, *args)
+
+# rendering is PIL work and network io, both release the gil, so it runs on
+# threads. at most RENDER_QUEUE renders may be queued or running at once,
+# callers past that wait on the event loop instead of piling up work
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', worker_count() + 1))
+RENDER_QUEUE = int(os.getenv('RENDER_QUEUE', RENDER_WORKERS * 4))
+
+_render_pool = None
+_render_slots = None
+
+def render_pool():
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix='render')
+    return _render_pool
+
+async def run_in_render_pool(fn, *args):
+    '''
+    runs fn(*args) on the render threads, waiting for a free slot first
+    '''
+    global _render_slots
+    if _render_slots is None:
+        _render_slots = asyncio.Semaphore(RENDER_QUEUE)
+    async with _render_slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(render_pool(), fn, *args)
@@ -1,3 +1,14 @@
-def z_order_hash(row, col):
-    # https://stackoverflow.com/a/682481
-    return ( row << 16 ) ^ col
+import random
+from functools import lru_cache
+
+ZOBRIST_SEED = 0x60B0
+
+@lru_cache(maxsize=None)
+def zobrist_table(points, colors=2, seed=ZOBRIST_SEED):
+    # https://en.wikipedia.org/wiki/Zobrist_hashing
+    # seeded so a position hashes the same in every process and every deploy
+    rng = random.Random(f'{seed}:{points}')
+    return tuple(
+        tuple(rng.getrandbits(64) for _ in range(points))
+        for _ in range(colors + 1)
+    )
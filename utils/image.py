@@ -1,5 +1,10 @@
+import os
 import pathlib
+import tempfile
+import threading
+import subprocess
 from io import BytesIO
+from collections import OrderedDict
 
 import ffmpeg
 import requests
@@ -7,23 +12,146 @@ import cairosvg
 
 from PIL import Image
 
-def export_replay(filepath, filename, hold_seconds=1):
-    ffmpeg.input(
-        f'{filepath}/*.jpg',
-        pattern_type='glob',
-        framerate=1,
-    ).output(f'{filepath}/temp_{filename}').run()
-    ffmpeg.input(
-        f'{filepath}/temp_{filename}',
-        # https://stackoverflow.com/a/24111474
-        # https://stackoverflow.com/a/43417253
-        filter_complex=f"[0]trim=0:{hold_seconds}[hold];[0][hold]concat[extended];[extended][0]overlay",
-    ).output(f'{filepath}/{filename}').run()
-    pathlib.Path(f'{filepath}/temp_{filename}').unlink()
-    return f'{filepath}/{filename}.mp4'
-
-def get_emoji_svg(emoji, scale):
-    emoji = '%04x' % int(f'{ord(emoji):X}', 16)
+class ReplayEncoder():
+    '''
+    one ffmpeg process that takes encoded frames (jpeg, png, ...) over stdin
+    and holds the last frame for hold_seconds in the same pass
+    '''
+    def __init__(self, output_path, framerate=1, hold_seconds=1):
+        self.output_path = output_path
+        stream = ffmpeg.input('pipe:', format='image2pipe', framerate=framerate)
+        # https://ffmpeg.org/ffmpeg-filters.html#tpad
+        stream = stream.filter('tpad', stop_mode='clone', stop_duration=hold_seconds)
+        # yuv420p needs even dimensions
+        stream = stream.filter('scale', 'trunc(iw/2)*2', 'trunc(ih/2)*2')
+        args = stream.output(output_path, pix_fmt='yuv420p', r=framerate) \
+            .global_args('-loglevel', 'error') \
+            .overwrite_output() \
+            .compile()
+        # errors go to a file, a pipe nobody reads fills up and stalls ffmpeg
+        self.log = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self.log)
+
+    def write(self, frame):
+        self.process.stdin.write(frame)
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            # ffmpeg already exited, its log says why
+            pass
+        self.process.wait()
+        self.log.seek(0)
+        stderr = self.log.read()
+        self.log.close()
+        if self.process.returncode:
+            raise ffmpeg.Error('ffmpeg', None, stderr)
+        return self.output_path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, tb):
+        self.close()
+
+def export_replay(frames, output_path, hold_seconds=1):
+    '''
+    encodes an iterable of encoded frames into a video at output_path
+    '''
+    with ReplayEncoder(output_path, hold_seconds=hold_seconds) as encoder:
+        for frame in frames:
+            encoder.write(frame)
+    return output_path
+
+CACHE_DIRECTORY = os.getenv('CACHE_DIRECTORY')
+# optional local copy of the twemoji svg bundle, e.g. twemoji/assets/svg
+EMOJI_SVG_DIRECTORY = os.getenv('EMOJI_SVG_DIRECTORY')
+EMOJI_CDN = 'https://twemoji.maxcdn.com/v/13.0.1/svg'
+
+def emoji_codepoints(emoji):
+    # twemoji file names are unpadded hex and drop the emoji presentation
+    # selector, except in zero width joiner sequences, e.g. 1f3f3-fe0f-200d-1f308
+    if '\u200d' not in emoji:
+        emoji = emoji.replace('\ufe0f', '')
+    return '-'.join('%x' % ord(char) for char in emoji)
+
+def get_emoji_svg(emoji, scale, svg_directory=None):
+    name = emoji_codepoints(emoji)
     emoji_buff = BytesIO()
-    cairosvg.svg2png(url=f'https://twemoji.maxcdn.com/v/13.0.1/svg/{emoji}.svg', write_to=emoji_buff, scale=scale)
+    local = pathlib.Path(svg_directory) / f'{name}.svg' if svg_directory else None
+    if local and local.exists():
+        cairosvg.svg2png(url=str(local), write_to=emoji_buff, scale=scale)
+    else:
+        cairosvg.svg2png(url=f'{EMOJI_CDN}/{name}.svg', write_to=emoji_buff, scale=scale)
+    emoji_buff.seek(0)
     return emoji_buff
+
+class EmojiSpriteCache():
+    '''
+    rasterized emoji sprites keyed by (emoji, scale). lookups go memory ->
+    png on disk -> svg in the local bundle, and only fall back to the
+    twemoji cdn for an emoji the bundle does not have. every rasterized
+    sprite is written to disk so it is fetched at most once per deploy
+    '''
+    def __init__(self, directory, svg_directory=None, capacity=128):
+        self.directory = pathlib.Path(directory)
+        self.svg_directory = svg_directory
+        self.capacity = capacity
+        self.sprites = OrderedDict()
+        self.lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def path(self, emoji, scale):
+        return self.directory / f'{emoji_codepoints(emoji)}@{scale:.3f}.png'
+
+    def get(self, emoji, scale):
+        '''
+        RGBA sprite shared between renders, paste it but never modify or close it
+        '''
+        key = (emoji, round(scale, 3))
+        with self.lock:
+            sprite = self.sprites.get(key)
+            if sprite is not None:
+                self.sprites.move_to_end(key)
+                return sprite
+
+        path = self.path(*key)
+        if not path.exists():
+            buffer = get_emoji_svg(emoji, scale=key[1], svg_directory=self.svg_directory)
+            # write then rename so concurrent renders never read half a file
+            temp = path.with_suffix(f'.{threading.get_ident()}.tmp')
+            temp.write_bytes(buffer.getvalue())
+            temp.replace(path)
+
+        with Image.open(path) as image:
+            sprite = image.convert('RGBA')
+
+        with self.lock:
+            self.sprites[key] = sprite
+            self.sprites.move_to_end(key)
+            if len(self.sprites) > self.capacity:
+                self.sprites.popitem(last=False)
+        return sprite
+
+    def preload(self, emojis, scales):
+        '''
+        rasterizes every emoji at every scale ahead of time, e.g. from a
+        local svg bundle before going offline
+        '''
+        for emoji in emojis:
+            for scale in scales:
+                self.get(emoji, scale)
+
+_emoji_cache = None
+
+def emoji_cache():
+    global _emoji_cache
+    if _emoji_cache is None:
+        _emoji_cache = EmojiSpriteCache(
+            directory=f'{CACHE_DIRECTORY}/emoji',
+            svg_directory=EMOJI_SVG_DIRECTORY)
+    return _emoji_cache
+
+def get_emoji_sprite(emoji, scale):
+    return emoji_cache().get(emoji, scale)